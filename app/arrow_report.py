@@ -0,0 +1,168 @@
+import argparse
+import logging
+import statistics
+import tracemalloc
+from time import perf_counter
+from typing import Callable
+
+import pandas as pd
+import pyarrow as pa
+import utils
+from warmup import QueryLog, load_page
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(name="app - arrow report")
+
+
+class SemCache:
+    # cada repetição executa a consulta, como numa sessão que não encontra o resultado no cache
+    def get(self, key: str) -> None:
+        return None
+
+    def put(self, key: str, table: pa.Table) -> None:
+        pass
+
+
+def to_csv(df: pd.DataFrame) -> bytes:
+    # download como era feito antes: DataFrame do pandas, com o índice
+    return df.drop(columns=["dummy"], errors="ignore").to_csv().encode("utf-8")
+
+
+def get_cases() -> dict[str, tuple[Callable, Callable]]:
+    # para cada página, o caminho anterior (resultado convertido para pandas logo após a consulta, com melt e escala
+    # em pandas) e o atual (arrow até o gráfico, com unpivot e escala no DuckDB); ambos produzem o DataFrame do
+    # gráfico e o csv do download
+    escolas = load_page("Quantidade de escolas")
+    matriculas = load_page("Quantidade de matrículas")
+    acesso = load_page("Acesso a serviços básicos")
+    indices = load_page("Índices Educacionais")
+    convert_df = utils.convert_df.__wrapped__
+
+    uf = utils.get_valores_possiveis("microdados", "NO_UF")[0]
+    municipio = utils.get_valores_possiveis("microdados", "NO_MUNICIPIO")[0]
+    indicador = next(iter(utils.INDICADORES))
+    grupo = utils.get_valores_possiveis(indicador, "TP_GRUPO")[0]
+
+    def escolas_pandas():
+        df = utils.run_aggregate_query(
+            colunas={"Quantidade de escolas": "cast({QT_ESCOLAS_ATIVAS} as bigint)"},
+            dimensoes={"Ano": "NU_ANO_CENSO", "Dependência Administrativa": "TP_DEPENDENCIA"},
+            filtros={"NO_UF": uf},
+            having="{QT_ESCOLAS_ATIVAS} > 0"
+        ).to_pandas()
+        return df, to_csv(df)
+
+    def escolas_arrow():
+        df = escolas.get_df("Unidade da Federação", uf, "Dependência Administrativa")
+        return df.to_pandas(), convert_df(df)
+
+    def matriculas_pandas():
+        df = utils.run_aggregate_query(
+            colunas={nivel: f"cast({{{coluna}}} as bigint)" for nivel, coluna in matriculas.NIVEIS_ENSINO.items()},
+            dimensoes={"Ano": "NU_ANO_CENSO"},
+            filtros={"NO_MUNICIPIO": municipio}
+        ).to_pandas()
+        df = df.melt(
+            id_vars=df.columns[:1],
+            var_name="Nível de ensino",
+            value_name="Quantidade de matrículas",
+            value_vars=df.columns[1:]
+        )
+        df = df[df["Nível de ensino"].isin(["Educação Básica", "Ensino Médio"])]
+        return df, to_csv(df)
+
+    def matriculas_arrow():
+        df = matriculas.get_df("Município", municipio, "Dependência Administrativa", "Total")
+        df = utils.get_df_filtrado(df, "Nível de ensino", ["Educação Básica", "Ensino Médio"])
+        return df.to_pandas(), convert_df(df)
+
+    def acesso_pandas():
+        df = utils.run_aggregate_query(
+            colunas={
+                rotulo: f"round(cast({{{medida}}} as float) / {{QT_REGISTROS}}, 3)"
+                for rotulo, medida in acesso.SERVICOS["Abastecimento de água"].items()
+            },
+            dimensoes={"Ano": "NU_ANO_CENSO", "Município": "NO_MUNICIPIO", "Código Município": "CO_MUNICIPIO"}
+        ).to_pandas()
+        df = df.melt(
+            id_vars=df.columns[:3],
+            var_name="Serviço",
+            value_name="Taxa de acesso",
+            value_vars=df.columns[3:]
+        )
+        df["Nível de acesso em %"] = df["Taxa de acesso"] * 100
+        df = df.drop(columns=["Taxa de acesso"])
+        df = df[df["Serviço"].isin(["Rede Pública"])].drop(columns=["Serviço"])
+        return df, to_csv(df)
+
+    def acesso_arrow():
+        df = acesso.get_df("Abastecimento de água", "NO_MUNICIPIO", "Município", "Total", "Total")
+        df = acesso.get_df_filtrado(df, "Serviço", "Rede Pública").drop_columns(["Serviço"])
+        return df.to_pandas(), convert_df(df)
+
+    def indices_pandas():
+        df = indices.get_df_mapa(indicador, "Total", "Total", "Município", grupo).to_pandas()
+        return df, to_csv(df)
+
+    def indices_arrow():
+        df = indices.get_df_mapa(indicador, "Total", "Total", "Município", grupo)
+        return df.to_pandas(), convert_df(df)
+
+    return {
+        "Quantidade de escolas | UF": (escolas_pandas, escolas_arrow),
+        "Quantidade de matrículas | Município": (matriculas_pandas, matriculas_arrow),
+        "Acesso a serviços básicos | Mapa municípios": (acesso_pandas, acesso_arrow),
+        f"Índices Educacionais | Mapa {indicador}": (indices_pandas, indices_arrow),
+    }
+
+
+def measure(function: Callable, repetitions: int) -> dict[str, float]:
+    # alocações do python/numpy (pico no tracemalloc) e do pool de memória do arrow (bytes alocados no total);
+    # a memória do próprio DuckDB não aparece em nenhuma das duas
+    function()
+    latencies = []
+    for _ in range(repetitions):
+        start = perf_counter()
+        function()
+        latencies.append(perf_counter() - start)
+
+    pool = pa.default_memory_pool()
+    arrow_before = pool.total_bytes_allocated()
+    tracemalloc.start()
+    frame, _ = function()
+    _, python_peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {
+        "rows": len(frame),
+        "latency (ms)": statistics.median(latencies) * 1000,
+        "python peak (KB)": python_peak / 1024,
+        "arrow allocated (KB)": (pool.total_bytes_allocated() - arrow_before) / 1024,
+    }
+
+
+def main(repetitions: int) -> None:
+    utils.get_result_cache = SemCache
+    utils.get_query_log = lambda: QueryLog(None)
+    logging.getLogger(name="app - aggregate").setLevel(logging.WARNING)
+    rows = {}
+    for page, (pandas_path, arrow_path) in get_cases().items():
+        anterior = measure(pandas_path, repetitions)
+        atual = measure(arrow_path, repetitions)
+        # mesmas linhas, na mesma ordem: o unpivot do DuckDB tem de reproduzir a ordem do melt do pandas
+        try:
+            pd.testing.assert_frame_equal(pandas_path()[0].reset_index(drop=True), arrow_path()[0])
+        except AssertionError as e:
+            logger.warning(f"{page}: different frames\n{e}")
+        rows[(page, "pandas")] = anterior
+        rows[(page, "arrow")] = atual
+    df = pd.DataFrame(rows).T
+    logger.info(f"\n{df.round(1).to_string()}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Compara latência e alocações das páginas entre o caminho em pandas e o caminho em arrow"
+    )
+    parser.add_argument("--repetitions", type=int, default=20)
+    args = parser.parse_args()
+    main(args.repetitions)
@@ -0,0 +1,77 @@
+import logging
+import queue
+import statistics
+import threading
+from collections import Counter, deque
+from contextlib import contextmanager
+from time import monotonic, perf_counter
+from typing import Callable, Iterator
+
+import duckdb
+
+logger = logging.getLogger(name="app - pool")
+
+
+class ConnectionPool:
+    # cursores do mesmo banco, cada um usado por uma única consulta de cada vez; quem não encontra um cursor livre
+    # espera na fila até timeout segundos. setup prepara cada cursor novo (ex.: registrar os datasets do pyarrow,
+    # que são locais a cada conexão). As estatísticas de espera vão para o log a cada log_interval segundos em que
+    # houve consultas (0 desativa)
+    def __init__(
+            self,
+            con: duckdb.DuckDBPyConnection,
+            size: int,
+            timeout: float,
+            setup: Callable[[duckdb.DuckDBPyConnection], None] | None = None,
+            log_interval: float = 60
+    ) -> None:
+        self.size = size
+        self.timeout = timeout
+        self.log_interval = log_interval
+        self.last_log = monotonic()
+        self.idle = queue.LifoQueue()
+        for _ in range(size):
+            cursor = con.cursor()
+            if setup:
+                setup(cursor)
+            self.idle.put(cursor)
+        self.waits = deque(maxlen=1000)
+        self.counters = Counter()
+        self.lock = threading.Lock()
+
+    @contextmanager
+    def connection(self) -> Iterator[duckdb.DuckDBPyConnection]:
+        start = perf_counter()
+        try:
+            cursor = self.idle.get(timeout=self.timeout)
+        except queue.Empty:
+            with self.lock:
+                self.counters["timeouts"] += 1
+            logger.warning(f"No connection available after {self.timeout}s | {self.get_stats()}")
+            raise TimeoutError(f"Nenhuma conexão livre após {self.timeout}s")
+        wait = perf_counter() - start
+        with self.lock:
+            self.counters["acquisitions"] += 1
+            if wait > 0.001:
+                self.counters["waits"] += 1
+            self.waits.append(wait)
+            log = self.log_interval > 0 and monotonic() - self.last_log > self.log_interval
+            if log:
+                self.last_log = monotonic()
+        if log:
+            logger.info(f"Pool stats | {self.get_stats()}")
+        try:
+            yield cursor
+        finally:
+            self.idle.put(cursor)
+
+    def get_stats(self) -> dict[str, float]:
+        with self.lock:
+            waits = sorted(self.waits)
+            stats = {**self.counters, "size": self.size, "in_use": self.size - self.idle.qsize()}
+        if len(waits) >= 2:
+            quantiles = statistics.quantiles(waits, n=20)
+            stats |= {"wait_p50_ms": quantiles[9] * 1000, "wait_p95_ms": quantiles[18] * 1000}
+        if waits:
+            stats["wait_max_ms"] = waits[-1] * 1000
+        return stats
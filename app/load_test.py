@@ -0,0 +1,139 @@
+import argparse
+import json
+import logging
+import random
+import statistics
+import subprocess
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from time import perf_counter
+from typing import Callable
+
+import pandas as pd
+import utils
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(name="app - load test")
+
+# consultas das páginas, executadas sem o cache de resultados para medir apenas o acesso ao banco
+QUERIES = {
+    "Quantidade de escolas | Município": """
+        select NU_ANO_CENSO, TP_DEPENDENCIA, sum(QT_ESCOLAS_ATIVAS)
+        from microdados_cubo
+        where CO_MUNICIPIO = $co_municipio
+        group by all
+    """,
+    "Quantidade de matrículas | Unidade da Federação": """
+        select NU_ANO_CENSO, sum(QT_MAT_BAS), sum(QT_MAT_INF), sum(QT_MAT_FUND), sum(QT_MAT_MED)
+        from microdados_cubo
+        where NO_UF = $uf and TP_DEPENDENCIA = $dependencia
+        group by all
+    """,
+    "Acesso a serviços básicos | Microdados": """
+        select NU_ANO_CENSO, count(*) filter (where IN_AGUA_REDE_PUBLICA) / count(*)
+        from microdados
+        where NO_UF = $uf and TP_LOCALIZACAO = $localizacao
+        group by all
+    """,
+    "Índices Educacionais | Mapa": """
+        select NU_ANO_CENSO, NO_LOCALIDADE_GEOGRAFICA, CO_MUNICIPIO, METRICA
+        from TAP
+        where TP_LOCALIDADE_GEOGRAFICA = 'Município' and NO_CATEGORIA = 'Total' and NO_DEPENDENCIA = $dependencia
+    """,
+}
+
+
+def get_valores() -> dict[str, list]:
+    geografia = utils.execute_query("select distinct CO_MUNICIPIO, NO_UF from microdados_cubo").to_pandas()
+    return {
+        "co_municipio": geografia["CO_MUNICIPIO"].tolist(),
+        "uf": geografia["NO_UF"].unique().tolist(),
+        "dependencia": ["Total", "Estadual", "Municipal"],
+        "localizacao": ["Urbana", "Rural"],
+    }
+
+
+def execute_shared(query: str, parametros: dict) -> None:
+    # comportamento anterior: todas as sessões na mesma conexão
+    utils.con.execute(utils.get_statement(query), parametros).to_arrow_table()
+
+
+def execute_pool(query: str, parametros: dict) -> None:
+    utils.execute_query(query, parametros)
+
+
+def run_session(execute: Callable[[str, dict], None], valores: dict[str, list], queries: int, seed: int) -> list[tuple[float, bool]]:
+    generator = random.Random(seed)
+    results = []
+    for _ in range(queries):
+        query = generator.choice(list(QUERIES.values()))
+        parametros = {key: generator.choice(value) for key, value in valores.items() if f"${key}" in query}
+        start = perf_counter()
+        try:
+            execute(query, parametros)
+            ok = True
+        except Exception as e:  # conexão compartilhada usada por várias threads ao mesmo tempo
+            logger.debug(f"{e!r}")
+            ok = False
+        results.append((perf_counter() - start, ok))
+    return results
+
+
+def run(mode: str, sessions: int, queries: int) -> dict[str, float]:
+    execute = execute_shared if mode == "shared" else execute_pool
+    valores = get_valores()
+    start = perf_counter()
+    with ThreadPoolExecutor(max_workers=sessions) as executor:
+        futures = [executor.submit(run_session, execute, valores, queries, seed) for seed in range(sessions)]
+        results = [result for future in futures for result in future.result()]
+    elapsed = perf_counter() - start
+    latencies = sorted(latency for latency, ok in results if ok)
+    quantiles = statistics.quantiles(latencies, n=20)
+    stats = {
+        "queries": len(results),
+        "errors": sum(not ok for _, ok in results),
+        "p50 (ms)": quantiles[9] * 1000,
+        "p95 (ms)": quantiles[18] * 1000,
+        "max (ms)": latencies[-1] * 1000,
+        "queries/s": len(results) / elapsed,
+    }
+    if mode == "pool":
+        pool = utils.get_pool().get_stats()
+        stats |= {"pool wait p95 (ms)": pool.get("wait_p95_ms", 0), "pool wait max (ms)": pool.get("wait_max_ms", 0)}
+    return stats
+
+
+def run_subprocess(mode: str, sessions: int, queries: int, timeout: float) -> dict[str, float]:
+    # cada modo em um processo próprio: com a conexão compartilhada as sessões podem travar umas às outras
+    # (ex.: datasets do pyarrow registrados), e o processo travado é descartado no timeout
+    try:
+        process = subprocess.run(
+            [sys.executable, __file__, "--mode", mode, "--sessions", str(sessions), "--queries", str(queries)],
+            capture_output=True, text=True, timeout=timeout, check=True
+        )
+    except subprocess.TimeoutExpired:
+        logger.error(f"{mode}: no result after {timeout}s")
+        return {"queries": sessions * queries, "errors": sessions * queries}
+    return json.loads(process.stdout.splitlines()[-1])
+
+
+def main(sessions: int, queries: int, mode: str | None, timeout: float) -> None:
+    if mode:
+        print(json.dumps(run(mode, sessions, queries)))
+        return
+
+    logger.info(f"{sessions} sessions x {queries} queries, pool size {utils.POOL_SIZE}")
+    df = pd.DataFrame({mode: run_subprocess(mode, sessions, queries, timeout) for mode in ("shared", "pool")}).T
+    logger.info(f"\n{df.round(2).to_string()}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Simula sessões simultâneas do app e compara a conexão única com o pool de conexões"
+    )
+    parser.add_argument("--sessions", type=int, default=8, help="sessões simultâneas")
+    parser.add_argument("--queries", type=int, default=50, help="consultas por sessão")
+    parser.add_argument("--mode", choices=["shared", "pool"], help="executa apenas um dos modos")
+    parser.add_argument("--timeout", type=float, default=300, help="tempo máximo de cada modo (s)")
+    args = parser.parse_args()
+    main(args.sessions, args.queries, args.mode, args.timeout)
@@ -1,169 +1,95 @@
 import json
 
-import pandas as pd
 import plotly.express as px
+import pyarrow as pa
+import pyarrow.compute as pc
 import streamlit as st
-from utils import DIMENSOES_GEOGRAFICAS, DIMENSOES, run_query, convert_df, get_valores_possiveis
+from utils import DIMENSOES_GEOGRAFICAS, DIMENSOES, run_aggregate_query, convert_df, get_valores_possiveis, get_filtros_pai
+
+
+SERVICOS = {
+    "Abastecimento de água": {
+        "Rede Pública": "QT_IN_AGUA_REDE_PUBLICA",
+        "Poço artesiano": "QT_IN_AGUA_POCO_ARTESIANO",
+        "Cacimba/Cisterna/Poço": "QT_IN_AGUA_CACIMBA",
+        "Fonte/Rio/Igarapé/Riacho/Córrego": "QT_IN_AGUA_FONTE_RIO",
+        "Não há abastecimento de água": "QT_IN_AGUA_INEXISTENTE",
+        "Sem informações": "QT_SEM_INFO_AGUA",
+    },
+    "Abastecimento de energia elétrica": {
+        "Rede Pública": "QT_IN_ENERGIA_REDE_PUBLICA",
+        "Gerador movido a combustível fóssil": "QT_IN_ENERGIA_GERADOR_FOSSIL",
+        "Fontes de energia renováveis ou alternativas": "QT_IN_ENERGIA_RENOVAVEL",
+        "Não há energia elétrica": "QT_IN_ENERGIA_INEXISTENTE",
+        "Sem informações": "QT_SEM_INFO_ENERGIA",
+    },
+    "Esgoto sanitário": {
+        "Rede Pública": "QT_IN_ESGOTO_REDE_PUBLICA",
+        "Fossa Séptica": "QT_IN_ESGOTO_FOSSA_SEPTICA",
+        "Fossa rudimentar/comum": "QT_IN_ESGOTO_FOSSA_COMUM",
+        "Fossa": "QT_IN_ESGOTO_FOSSA",
+        "Não há esgotamento sanitário": "QT_IN_ESGOTO_INEXISTENTE",
+        "Sem informações": "QT_SEM_INFO_ESGOTO",
+    },
+    "Destinação do lixo": {
+        "Servico de coleta": "QT_IN_LIXO_SERVICO_COLETA",
+        "Queima": "QT_IN_LIXO_QUEIMA",
+        "Enterra": "QT_IN_LIXO_ENTERRA",
+        "Leva a uma destinação final financiada pelo poder público": "QT_IN_LIXO_DESTINO_FINAL_PUBLICO",
+        "Destinação do lixo - Descarta em outra área": "QT_IN_LIXO_DESCARTA_OUTRA_AREA",
+        "Sem informações": "QT_SEM_INFO_LIXO",
+    },
+    "Acesso a internet": {
+        "Acesso a internet": "QT_IN_INTERNET",
+        "Sem informações": "QT_SEM_INFO_INTERNET",
+    },
+}
 
 
-@st.cache_data
 def get_df(
         servico: str,
         dimensao_geografica: str,
         label_dimensao_geografica: str,
         filtro_localidade: str,
-        filtro_dependencia: str
-) -> pd.DataFrame:
-    if filtro_localidade == "Total":
-        string_filtro_localidade = "1"
-    else:
-        string_filtro_localidade = f"TP_LOCALIZACAO='{filtro_localidade}'"
-
-    if filtro_dependencia == "Total":
-        string_filtro_dependencia = "1"
-    else:
-        string_filtro_dependencia = f"TP_DEPENDENCIA='{filtro_dependencia}'"
+        filtro_dependencia: str,
+        filtros_pai: dict[str, str] | None = None
+) -> pa.Table:
+    filtros = dict(filtros_pai or {})
+    if filtro_localidade != "Total":
+        filtros["TP_LOCALIZACAO"] = filtro_localidade
+    if filtro_dependencia != "Total":
+        filtros["TP_DEPENDENCIA"] = filtro_dependencia
 
-    if dimensao_geografica in {"NO_UF", "NO_MESORREGIAO", "NO_MICRORREGIAO", "NO_MUNICIPIO"}:
-        codigo_dimensao_geografica = dimensao_geografica.replace("NO", "CO")
-        label_cod_dimensao_geo = f"Código {label_dimensao_geografica}"
-        string_cod_dimensao_geo = f"{codigo_dimensao_geografica} as '{label_cod_dimensao_geo}'"
-        groupby_cod_dimensao = ", 3"
-    else:
-        string_cod_dimensao_geo = "0 as dummy"
-        groupby_cod_dimensao = ""
+    dimensoes = {"Ano": "NU_ANO_CENSO", label_dimensao_geografica: dimensao_geografica}
+    tem_codigo = dimensao_geografica in {"NO_UF", "NO_MESORREGIAO", "NO_MICRORREGIAO", "NO_MUNICIPIO"}
+    if tem_codigo:
+        dimensoes[f"Código {label_dimensao_geografica}"] = dimensao_geografica.replace("NO", "CO")
 
-    match servico:
-        case "Abastecimento de água":
-            query = f"""
-                select
-                    NU_ANO_CENSO as 'Ano',
-                    {dimensao_geografica} as '{label_dimensao_geografica}',
-                    {string_cod_dimensao_geo},
-                    round(cast(count(*) filter (where IN_AGUA_REDE_PUBLICA) as float) / count(*), 3) as 'Rede Pública',
-                    round(cast(count(*) filter (where IN_AGUA_POCO_ARTESIANO) as float) / count(*), 3) as 'Poço artesiano',
-                    round(cast(count(*) filter (where IN_AGUA_CACIMBA) as float) / count(*), 3) as 'Cacimba/Cisterna/Poço',
-                    round(cast(count(*) filter (where IN_AGUA_FONTE_RIO) as float) / count(*), 3) as 'Fonte/Rio/Igarapé/Riacho/Córrego',
-                    round(cast(count(*) filter (where IN_AGUA_INEXISTENTE) as float) / count(*), 3) as 'Não há abastecimento de água',
-                    round(
-                        cast(count(*) filter
-                            (where not (IN_AGUA_REDE_PUBLICA or IN_AGUA_POCO_ARTESIANO or IN_AGUA_CACIMBA or IN_AGUA_FONTE_RIO or IN_AGUA_INEXISTENTE ))
-                            as float)
-                        / count(*)
-                    , 3) as 'Sem informações'
-                from microdados
-                where {string_filtro_dependencia} and {string_filtro_localidade}
-                group by 1, 2 {groupby_cod_dimensao}
-                order by 1
-            """
-        case "Abastecimento de energia elétrica":
-            query = f"""
-                select
-                    NU_ANO_CENSO as 'Ano',
-                    {dimensao_geografica} as '{label_dimensao_geografica}',
-                    {string_cod_dimensao_geo},
-                    round(cast(count(*) filter (where IN_ENERGIA_REDE_PUBLICA) as float) / count(*), 3) as 'Rede Pública',
-                    round(cast(count(*) filter (where IN_ENERGIA_GERADOR_FOSSIL) as float) / count(*), 3) as 'Gerador movido a combustível fóssil',
-                    round(cast(count(*) filter (where IN_ENERGIA_RENOVAVEL) as float) / count(*), 3) as 'Fontes de energia renováveis ou alternativas',
-                    round(cast(count(*) filter (where IN_ENERGIA_INEXISTENTE) as float) / count(*), 3) as 'Não há energia elétrica',
-                    round(
-                        cast(count(*) filter
-                            (where not (IN_ENERGIA_REDE_PUBLICA or IN_ENERGIA_GERADOR_FOSSIL or IN_ENERGIA_RENOVAVEL or IN_ENERGIA_INEXISTENTE))
-                            as float)
-                        / count(*)
-                    , 3) as 'Sem informações'
-                from microdados
-                where {string_filtro_dependencia} and {string_filtro_localidade}
-                group by 1, 2 {groupby_cod_dimensao}
-                order by 1
-            """
-        case "Esgoto sanitário":
-            query = f"""
-                select
-                    NU_ANO_CENSO as 'Ano',
-                    {dimensao_geografica} as '{label_dimensao_geografica}',
-                    {string_cod_dimensao_geo},
-                    round(cast(count(*) filter (where IN_ESGOTO_REDE_PUBLICA) as float) / count(*), 3) as 'Rede Pública',
-                    round(cast(count(*) filter (where IN_ESGOTO_FOSSA_SEPTICA) as float) / count(*), 3) as 'Fossa Séptica',
-                    round(cast(count(*) filter (where IN_ESGOTO_FOSSA_COMUM) as float) / count(*), 3) as 'Fossa rudimentar/comum',
-                    round(cast(count(*) filter (where IN_ESGOTO_FOSSA) as float) / count(*), 3) as 'Fossa',
-                    round(cast(count(*) filter (where IN_ESGOTO_INEXISTENTE) as float) / count(*), 3) as 'Não há esgotamento sanitário',
-                    round(
-                        cast(count(*) filter
-                            (where not (IN_ESGOTO_REDE_PUBLICA or IN_ESGOTO_FOSSA_SEPTICA or IN_ESGOTO_FOSSA_COMUM or IN_ESGOTO_FOSSA or IN_ESGOTO_INEXISTENTE ))
-                            as float)
-                        / count(*)
-                    , 3) as 'Sem informações'
-                from microdados
-                where {string_filtro_dependencia} and {string_filtro_localidade}
-                group by 1, 2 {groupby_cod_dimensao}
-                order by 1
-            """
-        case "Destinação do lixo":
-            query = f"""
-                select
-                    NU_ANO_CENSO as 'Ano',
-                    {dimensao_geografica} as '{label_dimensao_geografica}',
-                    {string_cod_dimensao_geo},
-                    round(cast(count(*) filter (where IN_LIXO_SERVICO_COLETA) as float) / count(*), 3) as 'Servico de coleta',
-                    round(cast(count(*) filter (where IN_LIXO_QUEIMA) as float) / count(*), 3) as 'Queima',
-                    round(cast(count(*) filter (where IN_LIXO_ENTERRA) as float) / count(*), 3) as 'Enterra',
-                    round(
-                            cast(count(*) filter (where IN_LIXO_DESTINO_FINAL_PUBLICO) as float)
-                            / count(*),
-                        3)
-                        as 'Leva a uma destinação final financiada pelo poder público',
-                    round(
-                            cast(count(*) filter (where IN_LIXO_DESCARTA_OUTRA_AREA) as float)
-                            / count(*),
-                        3)
-                        as 'Destinação do lixo - Descarta em outra área',
-                    round(
-                        cast(count(*) filter
-                            (where not (IN_LIXO_SERVICO_COLETA or IN_LIXO_QUEIMA or IN_LIXO_ENTERRA or IN_LIXO_DESTINO_FINAL_PUBLICO or IN_LIXO_DESCARTA_OUTRA_AREA ))
-                            as float)
-                        / count(*)
-                    , 3) as 'Sem informações'
-                from microdados
-                where {string_filtro_dependencia} and {string_filtro_localidade}
-                group by 1, 2 {groupby_cod_dimensao}
-                order by 1
-            """
-        case "Acesso a internet":
-            query = f"""
-                select
-                    NU_ANO_CENSO as 'Ano',
-                    {dimensao_geografica} as '{label_dimensao_geografica}',
-                    {string_cod_dimensao_geo},
-                    round(cast(count(*) filter (where IN_INTERNET) as float) / count(*), 3) as 'Acesso a internet',
-                from microdados
-                where {string_filtro_dependencia} and {string_filtro_localidade}
-                group by 1, 2 {groupby_cod_dimensao}
-                order by 1
-            """
-    df = run_query(query)
-    df = df.melt(
-        id_vars=df.columns[:3],
-        var_name="Serviço",
-        value_name="Taxa de acesso",
-        value_vars=df.columns[3:]
+    df = run_aggregate_query(
+        colunas={
+            rotulo: f"round(cast({{{medida}}} as float) / {{QT_REGISTROS}}, 3) * 100"
+            for rotulo, medida in SERVICOS[servico].items()
+        },
+        dimensoes=dimensoes,
+        filtros=filtros,
+        unpivot=("Serviço", "Nível de acesso em %")
     )
-    df["Nível de acesso em %"] = df["Taxa de acesso"] * 100
-    df = df.drop(columns=["Taxa de acesso"])
+    if not tem_codigo:
+        df = df.add_column(2, "dummy", pa.array([0] * df.num_rows, pa.int64()))
     return df
 
 
-@st.cache_data
-def get_df_filtrado(df: pd.DataFrame, coluna: str, filtro: str | list[str]) -> pd.DataFrame:
+def get_df_filtrado(df: pa.Table, coluna: str, filtro: str | list[str]) -> pa.Table:
     if filtro:
         if isinstance(filtro, str):
             filtro = [filtro]
-        df = df[df[coluna].isin(filtro)]
+        df = df.filter(pc.is_in(df[coluna], value_set=pa.array(filtro, df.schema.field(coluna).type)))
 
     return df
 
 
-def plot_linha(df: pd.DataFrame, title: str) -> None:
+def plot_linha(df: pa.Table, title: str) -> None:
+    df = df.to_pandas()
     fig = px.line(
         df,
         x="Ano",
@@ -176,7 +102,8 @@ def plot_linha(df: pd.DataFrame, title: str) -> None:
 
 
 # @st.cache_data
-def plot_mapa(df: pd.DataFrame, dimensao: str, title: str) -> None:
+def plot_mapa(df: pa.Table, dimensao: str, title: str) -> None:
+    df = df.to_pandas()
     if dimensao != "Município":
         df[dimensao] = df[dimensao].str.upper()
     geo_dict = {
@@ -210,7 +137,7 @@ def plot_mapa(df: pd.DataFrame, dimensao: str, title: str) -> None:
     st.plotly_chart(fig, use_container_width=True)
 
 
-def download(df: pd.DataFrame, title: str) -> None:
+def download(df: pa.Table, title: str) -> None:
     csv = convert_df(df)
     st.download_button(
         label="Download CSV",
@@ -226,16 +153,18 @@ def linha(
         filtro_dependencia: str,
         servico: str
 ) -> None:
+    filtros_pai = get_filtros_pai("microdados", DIMENSOES_GEOGRAFICAS[label_dimensao_geografica])
     filtro_dimensao_geografica = st.sidebar.selectbox(
         label_dimensao_geografica,
-        get_valores_possiveis("microdados", DIMENSOES_GEOGRAFICAS[label_dimensao_geografica])
+        get_valores_possiveis("microdados", DIMENSOES_GEOGRAFICAS[label_dimensao_geografica], *filtros_pai.values())
     )
     df = get_df(
         servico,
         DIMENSOES_GEOGRAFICAS[label_dimensao_geografica],
         label_dimensao_geografica,
         filtro_localidade,
-        filtro_dependencia
+        filtro_dependencia,
+        filtros_pai
     )
     df = get_df_filtrado(df, label_dimensao_geografica, filtro_dimensao_geografica)
     title = f"{servico} | {label_dimensao_geografica} - {filtro_dimensao_geografica} | " \
@@ -259,10 +188,10 @@ def mapa(
     )
     filtro_servico = st.sidebar.selectbox(
         servico,
-        df["Serviço"].unique().tolist()
+        pc.unique(df["Serviço"]).to_pylist()
     )
     df = get_df_filtrado(df, "Serviço", filtro_servico)
-    df = df.drop(columns=["Serviço"])
+    df = df.drop_columns(["Serviço"])
     title = title = f"{servico} - {filtro_servico}| " \
                     f"Dependência Administrativa - {filtro_dependencia} | Localidade - {filtro_localidade}"
     if st.button("Executar"):
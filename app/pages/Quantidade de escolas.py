@@ -1,37 +1,25 @@
-import pandas as pd
 import plotly.express as px
+import pyarrow as pa
 import streamlit as st
-from utils import DIMENSOES, DIMENSOES_GEOGRAFICAS, run_query, convert_df, get_valores_possiveis, get_df_filtrado
+from utils import DIMENSOES, DIMENSOES_GEOGRAFICAS, run_aggregate_query, convert_df, get_valores_possiveis, get_df_filtrado, get_filtros_pai
 
 
-@st.cache_data
 def get_df(
         label_dimensao_geografica: str,
         filtro_dimensao_geografica: str,
-        label_dimensao: str
-) -> pd.DataFrame:
-    query = f"""
-                    select
-                        NU_ANO_CENSO as 'Ano',
-                        {DIMENSOES[label_dimensao]} as '{label_dimensao}',
-                        cast(count(distinct(CO_ENTIDADE)) as bigint) as 'Quantidade de escolas'
-                    from microdados
-                    where
-                        {DIMENSOES_GEOGRAFICAS[label_dimensao_geografica]}='{filtro_dimensao_geografica}'
-                        and TP_SITUACAO_FUNCIONAMENTO='Em Atividade'
-                        and (
-                            QT_MAT_INF > 0
-                            or QT_MAT_FUND > 0
-                            or QT_MAT_MED > 0
-                            or QT_MAT_EJA > 0
-                        )
-                    group by NU_ANO_CENSO, {DIMENSOES[label_dimensao]}
-                    order by 1
-                """
-    return run_query(query)
+        label_dimensao: str,
+        filtros_pai: dict[str, str] | None = None
+) -> pa.Table:
+    return run_aggregate_query(
+        colunas={"Quantidade de escolas": "cast({QT_ESCOLAS_ATIVAS} as bigint)"},
+        dimensoes={"Ano": "NU_ANO_CENSO", label_dimensao: DIMENSOES[label_dimensao]},
+        filtros={DIMENSOES_GEOGRAFICAS[label_dimensao_geografica]: filtro_dimensao_geografica} | (filtros_pai or {}),
+        having="{QT_ESCOLAS_ATIVAS} > 0"
+    )
 
 
-def plot(df: pd.DataFrame, tipo_grafico: str, label_dimensao: str, title: str) -> None:
+def plot(df: pa.Table, tipo_grafico: str, label_dimensao: str, title: str) -> None:
+    df = df.to_pandas()
     match tipo_grafico:
         case "Barra":
             fig = px.bar(
@@ -55,7 +43,7 @@ def plot(df: pd.DataFrame, tipo_grafico: str, label_dimensao: str, title: str) -
     st.plotly_chart(fig, use_container_width=True)
 
 
-def download(df: pd.DataFrame, title: str) -> None:
+def download(df: pa.Table, title: str) -> None:
     csv = convert_df(df)
     st.download_button(
         label="Download CSV",
@@ -76,9 +64,10 @@ def main() -> None:
         DIMENSOES_GEOGRAFICAS.keys()
     )
 
+    filtros_pai = get_filtros_pai("microdados", DIMENSOES_GEOGRAFICAS[label_dimensao_geografica])
     filtro_dimensao_geografica = st.sidebar.selectbox(
         f"Filtro {label_dimensao_geografica}",
-        get_valores_possiveis("microdados", DIMENSOES_GEOGRAFICAS[label_dimensao_geografica])
+        get_valores_possiveis("microdados", DIMENSOES_GEOGRAFICAS[label_dimensao_geografica], *filtros_pai.values())
     )
 
     label_dimensao = st.sidebar.selectbox(
@@ -86,7 +75,7 @@ def main() -> None:
         DIMENSOES.keys()
     )
 
-    df = get_df(label_dimensao_geografica, filtro_dimensao_geografica, label_dimensao)
+    df = get_df(label_dimensao_geografica, filtro_dimensao_geografica, label_dimensao, filtros_pai)
 
     filtro_dimensao = st.sidebar.multiselect(
         f"Filtro {label_dimensao}",
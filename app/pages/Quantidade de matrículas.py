@@ -1,61 +1,52 @@
-import pandas as pd
 import plotly.express as px
+import pyarrow as pa
+import pyarrow.compute as pc
 import streamlit as st
-from utils import DIMENSOES, DIMENSOES_GEOGRAFICAS, run_query, convert_df, get_valores_possiveis, get_df_filtrado
+from utils import DIMENSOES, DIMENSOES_GEOGRAFICAS, run_aggregate_query, convert_df, get_valores_possiveis, get_df_filtrado, get_filtros_pai, MAX_ENTRIES, HASH_FUNCS
+
+
+NIVEIS_ENSINO = {
+    "Educação Básica": "QT_MAT_BAS",
+    "Educação Infantil - creche": "QT_MAT_INF_CRE",
+    "Educação Infantil - pré-escola": "QT_MAT_INF_PRE",
+    "Educação Infantil": "QT_MAT_INF",
+    "Ensino Fundamental - anos iniciais": "QT_MAT_FUND_AI",
+    "Ensino Fundamental - anos finais": "QT_MAT_FUND_AF",
+    "Ensino Fundamental": "QT_MAT_FUND",
+    "Ensino Médio": "QT_MAT_MED",
+    "Educação Profissional": "QT_MAT_PROF",
+    "Educação Profissional Técnica": "QT_MAT_PROF_TEC",
+    "Educação de Jovens e Adultos (EJA) - Ensino Fundamental": "QT_MAT_EJA_FUND",
+    "Educação de Jovens e Adultos (EJA) - Ensino Médio": "QT_MAT_EJA_MED",
+    "Educação de Jovens e Adultos (EJA)": "QT_MAT_EJA",
+    "Educação Especial Inclusiva": "QT_MAT_ESP_CC",
+    "Educação Especial Exclusiva": "QT_MAT_ESP_CE",
+    "Educação Especial": "QT_MAT_ESP",
+}
 
 
-@st.cache_data
 def get_df(
         label_dimensao_geografica: str,
         filtro_dimensao_geografica: str,
         label_dimensao: str,
-        filtro_dimensao: str
-) -> pd.DataFrame:
-    if filtro_dimensao == "Total":
-        string_filtro_dimensao = ""
-    else:
-        string_filtro_dimensao = f"and {DIMENSOES[label_dimensao]}='{filtro_dimensao}'"
-
-    query = f"""
-                select
-                    NU_ANO_CENSO as 'Ano',
-                    cast(sum(QT_MAT_BAS) as bigint) as 'Educação Básica',
-                    cast(sum(QT_MAT_INF_CRE) as bigint) as 'Educação Infantil - creche',
-                    cast(sum(QT_MAT_INF_PRE) as bigint) as 'Educação Infantil - pré-escola',
-                    cast(sum(QT_MAT_INF) as bigint) as 'Educação Infantil',
-                    cast(sum(QT_MAT_FUND_AI) as bigint) as 'Ensino Fundamental - anos iniciais',
-                    cast(sum(QT_MAT_FUND_AF) as bigint) as 'Ensino Fundamental - anos finais',
-                    cast(sum(QT_MAT_FUND) as bigint) as 'Ensino Fundamental',
-                    cast(sum(QT_MAT_MED) as bigint) as 'Ensino Médio',
-                    cast(sum(QT_MAT_PROF) as bigint) as 'Educação Profissional',
-                    cast(sum(QT_MAT_PROF_TEC) as bigint) as 'Educação Profissional Técnica',
-                    cast(sum(QT_MAT_EJA_FUND) as bigint) as 'Educação de Jovens e Adultos (EJA) - Ensino Fundamental',
-                    cast(sum(QT_MAT_EJA_MED) as bigint) as 'Educação de Jovens e Adultos (EJA) - Ensino Médio',
-                    cast(sum(QT_MAT_EJA) as bigint) as 'Educação de Jovens e Adultos (EJA)',
-                    cast(sum(QT_MAT_ESP_CC) as bigint) as 'Educação Especial Inclusiva',
-                    cast(sum(QT_MAT_ESP_CE) as bigint) as 'Educação Especial Exclusiva',
-                    cast(sum(QT_MAT_ESP) as bigint) as 'Educação Especial'
-                from microdados
-                where
-                    {DIMENSOES_GEOGRAFICAS[label_dimensao_geografica]}='{filtro_dimensao_geografica}'
-                    {string_filtro_dimensao}
-                group by NU_ANO_CENSO
-                order by 1
-            """
-
-    df = run_query(query)
-    df = df.melt(
-        id_vars=df.columns[:1],
-        var_name="Nível de ensino",
-        value_name="Quantidade de matrículas",
-        value_vars=df.columns[1:]
+        filtro_dimensao: str,
+        filtros_pai: dict[str, str] | None = None
+) -> pa.Table:
+    filtros = {DIMENSOES_GEOGRAFICAS[label_dimensao_geografica]: filtro_dimensao_geografica} | (filtros_pai or {})
+    if filtro_dimensao != "Total":
+        filtros[DIMENSOES[label_dimensao]] = filtro_dimensao
+
+    return run_aggregate_query(
+        colunas={nivel: f"cast({{{coluna}}} as bigint)" for nivel, coluna in NIVEIS_ENSINO.items()},
+        dimensoes={"Ano": "NU_ANO_CENSO"},
+        filtros=filtros,
+        unpivot=("Nível de ensino", "Quantidade de matrículas")
     )
 
-    return df
 
-
-@st.cache_data
-def plot(df: pd.DataFrame, tipo_grafico: str, title: str) -> None:
+@st.cache_data(max_entries=MAX_ENTRIES, hash_funcs=HASH_FUNCS)
+def plot(df: pa.Table, tipo_grafico: str, title: str) -> None:
+    df = df.to_pandas()
     match tipo_grafico:
         case "Barra":
             fig = px.bar(
@@ -80,7 +71,7 @@ def plot(df: pd.DataFrame, tipo_grafico: str, title: str) -> None:
     st.plotly_chart(fig, use_container_width=True)
 
 
-def download(df: pd.DataFrame, title: str) -> None:
+def download(df: pa.Table, title: str) -> None:
     csv = convert_df(df)
     st.download_button(
         label="Download CSV",
@@ -102,9 +93,10 @@ def main() -> None:
         DIMENSOES_GEOGRAFICAS.keys()
     )
 
+    filtros_pai = get_filtros_pai("microdados", DIMENSOES_GEOGRAFICAS[label_dimensao_geografica])
     filtro_dimensao_geografica = st.sidebar.selectbox(
         f"Filtro {label_dimensao_geografica}",
-        get_valores_possiveis("microdados", DIMENSOES_GEOGRAFICAS[label_dimensao_geografica])
+        get_valores_possiveis("microdados", DIMENSOES_GEOGRAFICAS[label_dimensao_geografica], *filtros_pai.values())
     )
 
     label_dimensao = st.sidebar.selectbox(
@@ -117,11 +109,11 @@ def main() -> None:
         ["Total"] + get_valores_possiveis("microdados", DIMENSOES[label_dimensao])
     )
 
-    df = get_df(label_dimensao_geografica, filtro_dimensao_geografica, label_dimensao, filtro_dimensao)
+    df = get_df(label_dimensao_geografica, filtro_dimensao_geografica, label_dimensao, filtro_dimensao, filtros_pai)
 
     filtro_nivel_ensino = st.sidebar.multiselect(
         "Nível de ensino",
-        df["Nível de ensino"].unique()
+        pc.unique(df["Nível de ensino"]).to_pylist()
     )
 
     df = get_df_filtrado(df, "Nível de ensino", filtro_nivel_ensino)
@@ -1,9 +1,10 @@
 import json
 
-import pandas as pd
 import plotly.express as px
+import pyarrow as pa
+import pyarrow.compute as pc
 import streamlit as st
-from utils import INDICADORES, run_query, convert_df, get_valores_possiveis
+from utils import INDICADORES, run_query, convert_df, get_valores_possiveis, get_itens_catalogo, MAX_ENTRIES, HASH_FUNCS
 
 
 DIMENSOES_GEOGRAFICAS = {
@@ -44,12 +45,30 @@ WIKI_INDICADORES = {
 }
 
 
+# código do IBGE de cada nível no mapa, o mesmo GEOCODIGO das features do geojson
+CODIGOS_GEOGRAFICOS = {
+    "Unidade Federativa": "CO_UF",
+    "Município": "CO_MUNICIPIO",
+}
+
+
+def get_localidades(indicador: str, dimensao_geografica: str) -> dict[str, str | int]:
+    # rótulo exibido -> localidade, do catálogo de dimensões; municípios homônimos são distinguidos pela UF e
+    # identificados pelo código
+    itens = get_itens_catalogo(indicador, "NO_LOCALIDADE_GEOGRAFICA", nivel=dimensao_geografica)
+    if dimensao_geografica == "Município":
+        return {item["ROTULO"]: item["CODIGO"] for item in itens}
+    return {item["ROTULO"]: item["VALOR"] for item in itens}
+
+
 def get_df_linha(
         indicador: str,
         Localidade: str,
         dependencia: str,
-        localidade_geografica: str,
-) -> pd.DataFrame:
+        dimensao_geografica: str,
+        localidade_geografica: str | int,
+) -> pa.Table:
+    coluna_localidade = "CO_MUNICIPIO" if dimensao_geografica == "Município" else "NO_LOCALIDADE_GEOGRAFICA"
     query = f"""
                 select
                     NU_ANO_CENSO as 'Ano',
@@ -57,11 +76,14 @@ def get_df_linha(
                     METRICA AS '{"Quantidade" if "Média" in indicador else  "índice em %"}'
                 from {INDICADORES[indicador]} i
                 where
-                    NO_LOCALIDADE_GEOGRAFICA='{localidade_geografica}'
-                    and NO_CATEGORIA = '{Localidade}'
-                    and NO_DEPENDENCIA = '{dependencia}'
+                    {coluna_localidade} = $localidade_geografica
+                    and NO_CATEGORIA = $localidade
+                    and NO_DEPENDENCIA = $dependencia
             """
-    return run_query(query)
+    return run_query(
+        query,
+        {"localidade_geografica": localidade_geografica, "localidade": Localidade, "dependencia": dependencia}
+    )
 
 
 def get_df_mapa(
@@ -70,34 +92,39 @@ def get_df_mapa(
         dependencia: str,
         dimensao_geografica: str,
         grupo: str,
-) -> pd.DataFrame:
+) -> pa.Table:
     query = f"""
                 select
                     NU_ANO_CENSO as 'Ano',
                     NO_LOCALIDADE_GEOGRAFICA as '{dimensao_geografica}',
+                    {CODIGOS_GEOGRAFICOS[dimensao_geografica]} as 'Código',
                     METRICA AS '{"Quantidade" if "Média" in indicador else  "índice em %"}'
                 from {INDICADORES[indicador]} i
                 where
-                    TP_GRUPO='{grupo}'
-                    and TP_LOCALIDADE_GEOGRAFICA='{dimensao_geografica}'
-                    and NO_CATEGORIA = '{localidade}'
-                    and NO_DEPENDENCIA = '{dependencia}'
+                    TP_GRUPO = $grupo
+                    and TP_LOCALIDADE_GEOGRAFICA = $dimensao_geografica
+                    and NO_CATEGORIA = $localidade
+                    and NO_DEPENDENCIA = $dependencia
             """
-    return run_query(query)
+    return run_query(
+        query,
+        {"grupo": grupo, "dimensao_geografica": dimensao_geografica, "localidade": localidade, "dependencia": dependencia}
+    )
 
 
 # @st.cache_data
-def get_df_filtrado(df: pd.DataFrame, coluna: str, filtro: list[str]) -> pd.DataFrame:
+def get_df_filtrado(df: pa.Table, coluna: str, filtro: list[str]) -> pa.Table:
     if filtro:
-        df = df[df[coluna].isin(filtro)]
+        df = df.filter(pc.is_in(df[coluna], value_set=pa.array(filtro, df.schema.field(coluna).type)))
     return df
 
 
 def plot_linha(
-        df: pd.DataFrame,
+        df: pa.Table,
         indicador: str,
         title: str
 ) -> None:
+    df = df.to_pandas()
     fig = px.line(
         df,
         x="Ano",
@@ -109,15 +136,14 @@ def plot_linha(
     st.plotly_chart(fig, use_container_width=True)
 
 
-@st.cache_data
-def plot_mapa(df: str, indicador: str,  title: str) -> None:
-    locations = df.columns[1]
-    if locations == "Município":
+@st.cache_data(max_entries=MAX_ENTRIES, hash_funcs=HASH_FUNCS)
+def plot_mapa(df: pa.Table, indicador: str,  title: str) -> None:
+    df = df.to_pandas()
+    # polígonos ligados pelo código do IBGE, sem depender da grafia dos nomes nem de municípios homônimos
+    if df.columns[1] == "Município":
         geojson_file = "data/geo/municipio.json"
-        geokey = "NOME"
     else:
         geojson_file = "data/geo/uf.json"
-        geokey = "NOME_UF"
 
     with open(geojson_file, encoding="latin1") as f:
         geojson = json.load(f)
@@ -125,10 +151,11 @@ def plot_mapa(df: str, indicador: str,  title: str) -> None:
     fig = px.choropleth_mapbox(
         df,
         geojson=geojson,
-        color=df.columns[2],
-        locations=locations,
+        color=df.columns[3],
+        locations="Código",
+        hover_name=df.columns[1],
         mapbox_style="white-bg",
-        featureidkey=f"properties.{geokey}",
+        featureidkey="properties.GEOCODIGO",
         center={"lat": -14, "lon": -55},
         animation_frame="Ano",
         color_continuous_scale="Viridis",
@@ -140,7 +167,7 @@ def plot_mapa(df: str, indicador: str,  title: str) -> None:
     st.plotly_chart(fig, use_container_width=True)
 
 
-def download(df: pd.DataFrame,
+def download(df: pa.Table,
              title: str
              ) -> None:
     csv = convert_df(df)
@@ -153,16 +180,17 @@ def download(df: pd.DataFrame,
 
 
 def linha(Localidade: str, dependencia: str, indicador: str, dimensao_geografica: str) -> None:
+    localidades = get_localidades(indicador, dimensao_geografica)
     filtro_dimensao_geografica = st.sidebar.selectbox(
         "Filtro dimensão geográfica",
-        run_query(f"select distinct NO_LOCALIDADE_GEOGRAFICA from {INDICADORES[indicador]} "
-                  f"where TP_LOCALIDADE_GEOGRAFICA='{dimensao_geografica}'")
+        localidades.keys()
     )
     df = get_df_linha(
         indicador,
         Localidade,
         dependencia,
-        localidade_geografica=filtro_dimensao_geografica
+        dimensao_geografica,
+        localidade_geografica=localidades[filtro_dimensao_geografica]
     )
     grupo = st.sidebar.multiselect(
         "Grupo",
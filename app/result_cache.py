@@ -0,0 +1,182 @@
+import hashlib
+import json
+import logging
+import os
+import threading
+from collections import Counter, OrderedDict
+from time import monotonic
+
+import pyarrow as pa
+
+logger = logging.getLogger(name="app - cache")
+
+IPC_OPTIONS = pa.ipc.IpcWriteOptions(compression="zstd")
+DISK_TARGET = 0.9
+
+
+def get_key(*parts: object) -> str:
+    return hashlib.sha256(json.dumps(parts, sort_keys=True, default=str).encode()).hexdigest()
+
+
+def serialize(table: pa.Table) -> bytes:
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, table.schema, options=IPC_OPTIONS) as writer:
+        writer.write_table(table)
+    return sink.getvalue().to_pybytes()
+
+
+def deserialize(data: bytes) -> pa.Table:
+    return pa.ipc.open_stream(data).read_all()
+
+
+def hash_table(table: pa.Table) -> str:
+    # o st.cache_data não sabe calcular o hash de tabelas do pyarrow; o ipc sem compressão é lido direto da memória
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return hashlib.sha256(sink.getvalue()).hexdigest()
+
+
+class ResultCache:
+    # resultados guardados como arrow ipc comprimido com zstd: em memória, com descarte do menos usado
+    # recentemente (LRU) ao passar de max_bytes, e opcionalmente em disco, numa pasta que sobrevive a reinícios e
+    # pode ser compartilhada por vários processos do app, com o mesmo descarte ao passar de max_disk_bytes.
+    # o total em disco é mantido a cada gravação, e a pasta só é varrida quando ele passa de max_disk_bytes ou a cada
+    # disk_scan_interval segundos, para incluir o que os outros processos gravaram ou descartaram. As estatísticas vão
+    # para o log a cada log_interval segundos em que o cache é consultado (0 desativa)
+    def __init__(
+            self,
+            max_bytes: int,
+            folder: str | None = None,
+            max_disk_bytes: int = 1 << 30,
+            disk_scan_interval: float = 60,
+            log_interval: float = 60
+    ) -> None:
+        self.max_bytes = max_bytes
+        self.folder = folder
+        self.max_disk_bytes = max_disk_bytes
+        self.disk_scan_interval = disk_scan_interval
+        self.log_interval = log_interval
+        self.last_log = monotonic()
+        self.entries: OrderedDict[str, bytes] = OrderedDict()
+        self.size = 0
+        self.disk_size = 0
+        self.last_scan = monotonic()
+        self.counters = Counter()
+        self.lock = threading.Lock()
+        if folder:
+            os.makedirs(folder, exist_ok=True)
+            self.evict_disk()
+
+    def get(self, key: str) -> pa.Table | None:
+        table = self.find(key)
+        self.log_stats()
+        return table
+
+    def find(self, key: str) -> pa.Table | None:
+        with self.lock:
+            data = self.entries.get(key)
+            if data is not None:
+                self.entries.move_to_end(key)
+                self.counters["hits"] += 1
+                return deserialize(data)
+
+        data = self.read_disk(key)
+        if data is None:
+            with self.lock:
+                self.counters["misses"] += 1
+            return None
+        with self.lock:
+            self.counters["disk_hits"] += 1
+            self.add(key, data)
+        return deserialize(data)
+
+    def put(self, key: str, table: pa.Table) -> None:
+        data = serialize(table)
+        with self.lock:
+            self.add(key, data)
+        self.write_disk(key, data)
+        logger.debug(f"{key[:12]}: {table.num_rows} rows, {len(data)} bytes")
+
+    def add(self, key: str, data: bytes) -> None:
+        # chamado com o lock; resultados maiores que o orçamento inteiro não ficam em memória
+        if key in self.entries:
+            self.size -= len(self.entries.pop(key))
+        if len(data) > self.max_bytes:
+            self.counters["too_large"] += 1
+            return
+        self.entries[key] = data
+        self.size += len(data)
+        while self.size > self.max_bytes:
+            _, evicted = self.entries.popitem(last=False)
+            self.size -= len(evicted)
+            self.counters["evictions"] += 1
+
+    def get_path(self, key: str) -> str:
+        return f"{self.folder}/{key}.arrows"
+
+    def read_disk(self, key: str) -> bytes | None:
+        if not self.folder:
+            return None
+        try:
+            with open(self.get_path(key), "rb") as f:
+                data = f.read()
+            # a data de acesso marca o uso recente para o descarte em disco
+            os.utime(self.get_path(key))
+            return data
+        except FileNotFoundError:  # ausente ou descartado por outro processo
+            return None
+
+    def write_disk(self, key: str, data: bytes) -> None:
+        if not self.folder:
+            return
+        # escrita atômica: outro processo lê o arquivo completo ou não o encontra
+        tmp = f"{self.get_path(key)}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp, "wb") as f:
+            f.write(data)
+        os.replace(tmp, self.get_path(key))
+        with self.lock:
+            self.disk_size += len(data)
+            scan = self.disk_size > self.max_disk_bytes or monotonic() - self.last_scan > self.disk_scan_interval
+            if scan:
+                self.last_scan = monotonic()
+        if scan:
+            self.evict_disk()
+
+    def evict_disk(self) -> None:
+        files = []
+        for entry in os.scandir(self.folder):
+            if entry.name.endswith(".arrows"):
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:
+                    continue
+                files.append((stat.st_mtime, stat.st_size, entry.path))
+        size = sum(file_size for _, file_size, _ in files)
+        # ao passar do orçamento, o descarte vai até DISK_TARGET dele, para que as gravações seguintes não varram a
+        # pasta de novo a cada resultado
+        target = size if size <= self.max_disk_bytes else self.max_disk_bytes * DISK_TARGET
+        for _, file_size, path in sorted(files):
+            if size <= target:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            size -= file_size
+            with self.lock:
+                self.counters["disk_evictions"] += 1
+        with self.lock:
+            self.disk_size = size
+
+    def log_stats(self) -> None:
+        with self.lock:
+            log = self.log_interval > 0 and monotonic() - self.last_log > self.log_interval
+            if log:
+                self.last_log = monotonic()
+        if log:
+            logger.info(f"Cache stats | {self.get_stats()}")
+
+    def get_stats(self) -> dict[str, int]:
+        with self.lock:
+            return {**self.counters, "entries": len(self.entries), "bytes": self.size, "disk_bytes": self.disk_size}
@@ -1,7 +1,23 @@
+import atexit
+import logging
+import os
+import threading
+from collections import Counter
+from functools import cache
+from io import BytesIO
+from string import Formatter
+from time import monotonic
+from typing import Any, Callable
+
 import duckdb
-import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.csv as csv
 import streamlit as st
+from connection_pool import ConnectionPool
 from pyarrow import dataset as ds
+from result_cache import ResultCache, get_key, hash_table
+from warmup import QueryLog, read_paginas, warm_up
 
 INDICADORES = {
     "Adequação da Formação Docente": "AFD",
@@ -29,49 +45,423 @@ DIMENSOES_GEOGRAFICAS = {
     "Município": "NO_MUNICIPIO"
 }
 
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(name="app - aggregate")
+
+# banco gerado pelo etl/load.py; sem ele, os parquets de data/transformed são registrados a cada inicialização
+DATABASE = "data/educenso.duckdb"
+
+# cache de resultados: orçamento em memória por processo e pasta em disco compartilhada entre processos e
+# reinícios (EDUCENSO_CACHE_DIR vazio desativa o disco)
+CACHE_MAX_BYTES = int(os.environ.get("EDUCENSO_CACHE_MB", 128)) << 20
+CACHE_FOLDER = os.environ.get("EDUCENSO_CACHE_DIR", "data/cache/app")
+CACHE_MAX_DISK_BYTES = int(os.environ.get("EDUCENSO_CACHE_DISK_MB", 1024)) << 20
+CACHE_LOG_INTERVAL = float(os.environ.get("EDUCENSO_CACHE_LOG_INTERVAL", 60))
+# limite dos st.cache_data que ainda guardam objetos derivados dos resultados (csv, gráficos), e o hash das
+# tabelas do pyarrow recebidas por eles
+MAX_ENTRIES = 32
+HASH_FUNCS = {pa.Table: hash_table}
+
+# aquecimento do cache na inicialização, em segundo plano: as seleções de WARMUP_FILE e as WARMUP_QUERIES consultas
+# mais pedidas, pela frequência registrada na pasta do cache em disco (EDUCENSO_WARMUP=0 desativa)
+WARMUP = os.environ.get("EDUCENSO_WARMUP", "1") != "0"
+WARMUP_FILE = os.environ.get("EDUCENSO_WARMUP_FILE", "app/warmup.json")
+WARMUP_QUERIES = int(os.environ.get("EDUCENSO_WARMUP_QUERIES", 50))
+
+# pool de conexões: cada consulta usa um cursor próprio, e quem não encontra um livre espera até o timeout (s)
+POOL_SIZE = int(os.environ.get("EDUCENSO_POOL_SIZE", 4))
+POOL_TIMEOUT = float(os.environ.get("EDUCENSO_POOL_TIMEOUT", 30))
+# intervalo (s) entre os registros no log das estatísticas de espera do pool
+POOL_LOG_INTERVAL = float(os.environ.get("EDUCENSO_POOL_LOG_INTERVAL", 60))
+# threads e memória do DuckDB são configurações da instância do banco, não de cada conexão: os cursores do pool
+# compartilham o mesmo conjunto de threads e o mesmo teto de memória, e uma única consulta pode usar todos eles
+DUCKDB_CONFIG = {
+    setting: value for setting, value in {
+        "threads": os.environ.get("EDUCENSO_DUCKDB_THREADS"),
+        "memory_limit": os.environ.get("EDUCENSO_DUCKDB_MEMORY"),
+    }.items() if value
+}
+
+# intervalo (s) entre os registros no log das consultas atendidas por fonte (agregados ou microdados)
+FONTES_LOG_INTERVAL = float(os.environ.get("EDUCENSO_FONTES_LOG_INTERVAL", 60))
+
+# medidas em termos das linhas de microdados; os agregados guardam cada medida já calculada por célula
+MEDIDAS = {
+    "QT_REGISTROS": "count(*)",
+    "QT_ESCOLAS_ATIVAS": """count(distinct CO_ENTIDADE) filter (
+        where TP_SITUACAO_FUNCIONAMENTO = 'Em Atividade'
+        and (QT_MAT_INF > 0 or QT_MAT_FUND > 0 or QT_MAT_MED > 0 or QT_MAT_EJA > 0)
+    )""",
+    **{
+        f"QT_{flag}": f"count(*) filter (where {flag})"
+        for flag in [
+            "IN_AGUA_REDE_PUBLICA", "IN_AGUA_POCO_ARTESIANO", "IN_AGUA_CACIMBA", "IN_AGUA_FONTE_RIO",
+            "IN_AGUA_INEXISTENTE", "IN_ENERGIA_REDE_PUBLICA", "IN_ENERGIA_GERADOR_FOSSIL", "IN_ENERGIA_RENOVAVEL",
+            "IN_ENERGIA_INEXISTENTE", "IN_ESGOTO_REDE_PUBLICA", "IN_ESGOTO_FOSSA_SEPTICA", "IN_ESGOTO_FOSSA_COMUM",
+            "IN_ESGOTO_FOSSA", "IN_ESGOTO_INEXISTENTE", "IN_LIXO_SERVICO_COLETA", "IN_LIXO_QUEIMA", "IN_LIXO_ENTERRA",
+            "IN_LIXO_DESTINO_FINAL_PUBLICO", "IN_LIXO_DESCARTA_OUTRA_AREA", "IN_INTERNET",
+        ]
+    },
+    "QT_SEM_INFO_AGUA": """count(*) filter (where not coalesce(
+        IN_AGUA_REDE_PUBLICA or IN_AGUA_POCO_ARTESIANO or IN_AGUA_CACIMBA or IN_AGUA_FONTE_RIO or IN_AGUA_INEXISTENTE,
+        false
+    ))""",
+    "QT_SEM_INFO_ENERGIA": """count(*) filter (where not coalesce(
+        IN_ENERGIA_REDE_PUBLICA or IN_ENERGIA_GERADOR_FOSSIL or IN_ENERGIA_RENOVAVEL or IN_ENERGIA_INEXISTENTE, false
+    ))""",
+    "QT_SEM_INFO_ESGOTO": """count(*) filter (where not coalesce(
+        IN_ESGOTO_REDE_PUBLICA or IN_ESGOTO_FOSSA_SEPTICA or IN_ESGOTO_FOSSA_COMUM or IN_ESGOTO_FOSSA
+        or IN_ESGOTO_INEXISTENTE,
+        false
+    ))""",
+    "QT_SEM_INFO_LIXO": """count(*) filter (where not coalesce(
+        IN_LIXO_SERVICO_COLETA or IN_LIXO_QUEIMA or IN_LIXO_ENTERRA or IN_LIXO_DESTINO_FINAL_PUBLICO
+        or IN_LIXO_DESCARTA_OUTRA_AREA,
+        false
+    ))""",
+    "QT_SEM_INFO_INTERNET": "count(*) filter (where IN_INTERNET is null)",
+    **{
+        column: f"sum({column})"
+        for column in [
+            "QT_MAT_BAS", "QT_MAT_INF_CRE", "QT_MAT_INF_PRE", "QT_MAT_INF", "QT_MAT_FUND_AI", "QT_MAT_FUND_AF",
+            "QT_MAT_FUND", "QT_MAT_MED", "QT_MAT_PROF", "QT_MAT_PROF_TEC", "QT_MAT_EJA_FUND", "QT_MAT_EJA_MED",
+            "QT_MAT_EJA", "QT_MAT_ESP_CC", "QT_MAT_ESP_CE", "QT_MAT_ESP",
+        ]
+    },
+}
+
+# agregados materializados pelo etl: dimensões pelas quais podem ser agrupados ou filtrados e medidas aditivas que
+# guardam, combinadas com sum()
+AGREGADOS = {
+    "microdados_cubo": {
+        "dimensoes": {
+            "NU_ANO_CENSO", "NO_PAIS", "CO_REGIAO", "NO_REGIAO", "CO_UF", "NO_UF", "SG_UF", "CO_MESORREGIAO",
+            "NO_MESORREGIAO", "CO_MICRORREGIAO", "NO_MICRORREGIAO", "CO_MUNICIPIO", "NO_MUNICIPIO",
+            "TP_DEPENDENCIA", "TP_LOCALIZACAO",
+        },
+        "medidas": set(MEDIDAS),
+    },
+    # resumo ano x UF x dependência x localização, presente apenas no banco DuckDB
+    "microdados_uf": {
+        "dimensoes": {
+            "NU_ANO_CENSO", "NO_PAIS", "CO_REGIAO", "NO_REGIAO", "CO_UF", "NO_UF", "SG_UF", "TP_DEPENDENCIA",
+            "TP_LOCALIZACAO",
+        },
+        "medidas": set(MEDIDAS),
+    },
+}
+
+# quantidade de consultas atendidas por fonte, para avaliar quais agregados compensam manter
+FONTES_ATENDIDAS = Counter()
+fontes_lock = threading.Lock()
+last_fontes_log = monotonic()
+
+
+@cache
+def get_datasets() -> dict[str, ds.Dataset]:
+    return {
+        "microdados": ds.dataset("data/transformed/microdados.parquet", format="parquet", partitioning="hive"),
+        # cubo ano x município x dependência x localização com as contagens e somas usadas pelas páginas
+        "microdados_cubo": ds.dataset(
+            "data/transformed/microdados_cubo.parquet", format="parquet", partitioning="hive"
+        ),
+        # um registro por município com a hierarquia geográfica, ligado aos demais por CO_MUNICIPIO ou CO_UF
+        "geografia": ds.dataset("data/transformed/geografia.parquet", format="parquet"),
+        # um único dataset com todos os indicadores; cada indicador é uma view que lê apenas a sua partição
+        "indicadores": ds.dataset("data/transformed/indicadores.parquet", format="parquet", partitioning="hive"),
+        # valores distintos de cada dimensão, por fonte e nível geográfico, gerado pelo etl/catalog.py
+        "catalogo": ds.dataset("data/transformed/catalogo.parquet", format="parquet"),
+    }
+
+
+def register_datasets(con: duckdb.DuckDBPyConnection) -> None:
+    # os datasets registrados são locais à conexão, então cada cursor do pool os registra de novo
+    for name, dataset in get_datasets().items():
+        con.register(name, dataset)
+
 
 @st.cache_resource
 def init_db_connection() -> duckdb.DuckDBPyConnection:
-    con = duckdb.connect()
-    microdados = ds.dataset("data/transformed/microdados.parquet", format="parquet", partitioning="hive")
-    con.register("microdados", microdados)
+    if os.path.isfile(DATABASE):
+        # tabelas nativas, resumos e views já prontos; nada a registrar
+        logger.info(f"Using {DATABASE}")
+        return duckdb.connect(DATABASE, read_only=True, config=DUCKDB_CONFIG)
 
-    indicadores = {}
+    logger.info(f"{DATABASE} not found, registering the parquet datasets")
+    con = duckdb.connect(config=DUCKDB_CONFIG)
+    register_datasets(con)
     for indicador in INDICADORES.values():
-        indicadores[indicador] = ds.dataset(f"data/transformed/indicadores/{indicador}.parquet", format="parquet",
-                                            partitioning="hive")
-        con.register(indicador, indicadores[indicador])
+        con.execute(f"""
+            create view {indicador} as
+            select * exclude (SG_INDICADOR) from indicadores where SG_INDICADOR = '{indicador}'
+        """)
     return con
 
 
-@st.cache_data
-def run_query(query: str) -> pd.DataFrame:
-    return con.execute(query).df()
+@st.cache_resource
+def get_pool() -> ConnectionPool:
+    setup = None if os.path.isfile(DATABASE) else register_datasets
+    return ConnectionPool(con, POOL_SIZE, POOL_TIMEOUT, setup, POOL_LOG_INTERVAL)
+
+
+@st.cache_resource
+def get_result_cache() -> ResultCache:
+    return ResultCache(CACHE_MAX_BYTES, CACHE_FOLDER or None, CACHE_MAX_DISK_BYTES, log_interval=CACHE_LOG_INTERVAL)
+
+
+@st.cache_resource
+def get_query_log() -> QueryLog:
+    query_log = QueryLog(f"{CACHE_FOLDER}/consultas.json" if CACHE_FOLDER else None)
+    atexit.register(query_log.flush)
+    return query_log
+
+
+# recursos do processo criados por start_warmup na thread do script e repassados à thread do aquecimento: fora do
+# script, os getters do st.cache_resource não têm ScriptRunContext e geram avisos
+recursos_aquecimento = threading.local()
+
+
+def get_recurso(nome: str, getter: Callable[[], Any]) -> Any:
+    recurso = getattr(recursos_aquecimento, nome, None)
+    return getter() if recurso is None else recurso
+
+
+@cache
+def get_data_version() -> list:
+    # resultados em disco de uma carga anterior dos dados não são reaproveitados
+    if os.path.isfile(DATABASE):
+        stat = os.stat(DATABASE)
+        return [DATABASE, stat.st_size, stat.st_mtime_ns]
+    entries = sorted(os.scandir("data/transformed"), key=lambda entry: entry.name)
+    return [(entry.name, entry.stat().st_mtime_ns) for entry in entries]
+
+
+statement_lock = threading.Lock()
+
 
+@cache
+def get_statement(query: str) -> duckdb.Statement:
+    # cada modelo de consulta é analisado uma única vez e reaproveitado com novos parâmetros; a conexão base é
+    # compartilhada pelas sessões, daí o lock
+    with statement_lock:
+        return con.extract_statements(query)[0]
+
+
+def execute_query(query: str, parametros: dict[str, str | int] | None = None) -> pa.Table:
+    with get_recurso("pool", get_pool).connection() as cursor:
+        return cursor.execute(get_statement(query), parametros or {}).to_arrow_table()
+
+
+def run_query(query: str, parametros: dict[str, str | int] | None = None) -> pa.Table:
+    # query é um modelo fixo, com apenas identificadores de listas conhecidas interpolados, e os valores escolhidos
+    # nos widgets chegam como parâmetros ($nome); o cache fica indexado por (modelo, parâmetros) e nomes com aspas,
+    # como "Pau D'Arco", não quebram a consulta.
+    # o resultado segue em arrow até os gráficos, que são o único ponto de conversão para pandas
+    get_recurso("query_log", get_query_log).record(query, parametros)
+    result_cache = get_recurso("result_cache", get_result_cache)
+    key = get_key(get_data_version(), query, parametros)
+    table = result_cache.get(key)
+    if table is None:
+        table = execute_query(query, parametros)
+        result_cache.put(key, table)
+    return table
+
+
+@st.cache_resource
+def get_agregados() -> list[str]:
+    # do menor para o maior agregado, entre os disponíveis na conexão
+    disponiveis = set(execute_query("select table_name from information_schema.tables")["table_name"].to_pylist())
+    tamanhos = {
+        agregado: execute_query(f"select count(*) as linhas from {agregado}")["linhas"][0].as_py()
+        for agregado in AGREGADOS if agregado in disponiveis
+    }
+    return sorted(tamanhos, key=tamanhos.get)
+
+
+def get_fonte(medidas: set[str], dimensoes: set[str]) -> str:
+    for agregado in get_recurso("agregados", get_agregados):
+        if medidas <= AGREGADOS[agregado]["medidas"] and dimensoes <= AGREGADOS[agregado]["dimensoes"]:
+            return agregado
+    return "microdados"
+
+
+def count_fonte(fonte: str) -> None:
+    # a contagem vai para o log a cada FONTES_LOG_INTERVAL segundos, como as estatísticas do pool e do cache
+    global last_fontes_log
+    with fontes_lock:
+        FONTES_ATENDIDAS[fonte] += 1
+        log = FONTES_LOG_INTERVAL > 0 and monotonic() - last_fontes_log > FONTES_LOG_INTERVAL
+        if log:
+            last_fontes_log = monotonic()
+            hits = dict(FONTES_ATENDIDAS)
+    if log:
+        logger.info(f"Hits by source | {hits}")
+
+
+def run_aggregate_query(
+        colunas: dict[str, str],
+        dimensoes: dict[str, str],
+        filtros: dict[str, str] | None = None,
+        having: str | None = None,
+        unpivot: tuple[str, str] | None = None
+) -> pa.Table:
+    # consulta descrita logicamente e executada na menor fonte capaz de respondê-la:
+    # colunas são expressões com as medidas entre chaves, ex. "round({QT_IN_INTERNET} / {QT_REGISTROS}, 3)",
+    # dimensoes e filtros usam as colunas de microdados e having segue o mesmo formato das colunas.
+    # unpivot=(nome, valor) transforma as colunas em linhas (formato longo dos gráficos) no próprio DuckDB
+    filtros = filtros or {}
+    expressoes = list(colunas.values()) + ([having] if having else [])
+    medidas = {campo for expressao in expressoes for _, campo, _, _ in Formatter().parse(expressao) if campo}
+    fonte = get_fonte(medidas, set(dimensoes.values()) | set(filtros))
+    filtros = get_filtros_codigo(fonte, filtros)
+    logger.debug(f"{fonte} served {sorted(medidas)} by {list(dimensoes.values())}")
+    # as consultas do aquecimento não contam como uso
+    if not get_recurso("query_log", get_query_log).is_suspended():
+        count_fonte(fonte)
 
-@st.cache_data
-def get_valores_possiveis(fonte: str, coluna: str) -> list[str]:
     if fonte == "microdados":
-        query = f"select distinct({coluna}) as value from microdados order by 1"
+        agregacoes = {medida: MEDIDAS[medida] for medida in medidas}
     else:
-        query = f"select distinct({coluna}) as value from {INDICADORES[fonte]} order by 1"
+        agregacoes = {medida: f"sum({medida})" for medida in medidas}
+    selects = [f"{coluna} as '{rotulo}'" for rotulo, coluna in dimensoes.items()]
+    selects += [f"{expressao.format(**agregacoes)} as '{rotulo}'" for rotulo, expressao in colunas.items()]
+    where = " and ".join(f"{coluna} = ${coluna}" for coluna in filtros) or "1"
+    # ordenado pelas dimensões, na ordem em que foram passadas
+    ordem = ", ".join(str(posicao) for posicao in range(1, len(dimensoes) + 1))
+    query = f"""
+        select {", ".join(selects)}
+        from {fonte}
+        where {where}
+        group by {", ".join(dimensoes.values())}
+        {f"having {having.format(**agregacoes)}" if having else ""}
+        order by {ordem}
+    """
+    if unpivot:
+        # o unpivot gera as linhas de cada grupo juntas; a ordem do melt do pandas é a das colunas e, dentro de cada
+        # coluna, a das dimensões
+        nome, valor = unpivot
+        rotulos = ", ".join(f"'{rotulo}'" for rotulo in colunas)
+        query = f"""
+            select * from ({query})
+            unpivot include nulls ("{valor}" for "{nome}" in ({", ".join(f'"{rotulo}"' for rotulo in colunas)}))
+            order by list_position([{rotulos}], "{nome}"), {ordem}
+        """
+    return run_query(query, filtros)
+
+
+@st.cache_resource
+def get_catalogo() -> dict[tuple[str, str], list[dict]]:
+    # lido uma única vez por processo; as listas dos widgets saem daqui, sem consultar microdados ou indicadores
+    catalogo = {}
+    query = "select * from catalogo order by FONTE, DIMENSAO, NIVEL, ROTULO, PAI_VALOR"
+    for item in execute_query(query).to_pylist():
+        catalogo.setdefault((item["FONTE"], item["DIMENSAO"]), []).append(item)
+    logger.info(f"Catalog with {sum(map(len, catalogo.values()))} values")
+    return catalogo
 
-    return run_query(query)["value"].tolist()
 
+def get_itens_catalogo(fonte: str, coluna: str, nivel: str | None = None) -> list[dict]:
+    # fonte é "microdados" ou o nome de um indicador; nivel restringe ao nível geográfico (indicadores)
+    sigla = fonte if fonte == "microdados" else INDICADORES[fonte]
+    itens = get_recurso("catalogo", get_catalogo).get((sigla, coluna), [])
+    return [item for item in itens if nivel is None or item["NIVEL"] == nivel]
 
-@st.cache_data
-def get_df_filtrado(df: pd.DataFrame, dimensao: str, filtro: list[str]) -> pd.DataFrame:
+
+def get_dimensao_pai(fonte: str, coluna: str) -> str | None:
+    # nível acima pelo qual a lista de valores pode ser restringida (filtros em cascata), ex.: NO_UF para municípios
+    return next((item["PAI_DIMENSAO"] for item in get_itens_catalogo(fonte, coluna)), None)
+
+
+@cache
+def get_valores_possiveis(fonte: str, coluna: str, pai: str | None = None) -> list[str]:
+    itens = get_itens_catalogo(fonte, coluna)
+    return list(dict.fromkeys(item["VALOR"] for item in itens if pai is None or item["PAI_VALOR"] == pai))
+
+
+@cache
+def get_codigos(coluna: str) -> dict[str, list[tuple[str | None, int]]]:
+    # código do IBGE de cada nome geográfico dos microdados, com o valor do nível acima (homônimos)
+    codigos = {}
+    for item in get_itens_catalogo("microdados", coluna):
+        if item["CODIGO"] is not None:
+            codigos.setdefault(item["VALOR"], []).append((item["PAI_VALOR"], item["CODIGO"]))
+    return codigos
+
+
+def get_filtros_codigo(fonte: str, filtros: dict[str, str]) -> dict[str, str | int]:
+    # as páginas filtram pelo nome, mas microdados e agregados estão ordenados pelos códigos do IBGE, e o scanner do
+    # pyarrow só descarta row groups pelas estatísticas min/max de colunas simples como CO_*, não das colunas
+    # dictionary NO_*. Cada nome com um único código, considerado o nível acima quando filtrado, vira o filtro pelo
+    # código; municípios homônimos sem a UF continuam filtrados pelo nome
+    traduzidos = {}
+    for coluna, valor in filtros.items():
+        codigo = coluna.replace("NO_", "CO_", 1)
+        pai = get_dimensao_pai("microdados", coluna)
+        candidatos = {
+            co for pai_valor, co in get_codigos(coluna).get(valor, []) if pai not in filtros or pai_valor == filtros[pai]
+        } if fonte == "microdados" or codigo in AGREGADOS[fonte]["dimensoes"] else set()
+        if len(candidatos) == 1:
+            traduzidos[codigo] = candidatos.pop()
+        else:
+            traduzidos[coluna] = valor
+    return traduzidos
+
+
+def get_filtros_pai(fonte: str, coluna: str) -> dict[str, str]:
+    # filtro em cascata: para dimensões com pai no catálogo, a localidade do nível acima é escolhida antes e
+    # restringe a lista seguinte e a consulta, o que também separa municípios homônimos de UFs diferentes
+    dimensao_pai = get_dimensao_pai(fonte, coluna)
+    if dimensao_pai is None:
+        return {}
+    label = next(label for label, dimensao in DIMENSOES_GEOGRAFICAS.items() if dimensao == dimensao_pai)
+    return {dimensao_pai: st.sidebar.selectbox(label, get_valores_possiveis(fonte, dimensao_pai))}
+
+
+def get_df_filtrado(df: pa.Table, dimensao: str, filtro: str | list[str]) -> pa.Table:
     if filtro:
         if isinstance(filtro, str):
             filtro = [filtro]
-        df = df[df[dimensao].isin(filtro)]
+        df = df.filter(pc.is_in(df[dimensao], value_set=pa.array(filtro, df.schema.field(dimensao).type)))
     return df
 
 
-@st.cache_data
-def convert_df(df: pd.DataFrame) -> bytes:
-    df = df.drop(columns=["dummy"], errors="ignore")
-    return df.to_csv().encode('utf-8')
+@st.cache_data(max_entries=MAX_ENTRIES, hash_funcs=HASH_FUNCS)
+def convert_df(df: pa.Table) -> bytes:
+    if "dummy" in df.column_names:
+        df = df.drop_columns(["dummy"])
+    buffer = BytesIO()
+    csv.write_csv(df, buffer, csv.WriteOptions(quoting_style="needed"))
+    return buffer.getvalue()
+
+
+def run_warmup(recursos: dict[str, Any], paginas: list[dict], limit: int) -> None:
+    for nome, recurso in recursos.items():
+        setattr(recursos_aquecimento, nome, recurso)
+    warm_up(run_query, recursos["query_log"], paginas, limit)
+
+
+@st.cache_resource
+def start_warmup() -> threading.Thread:
+    # uma vez por processo; a primeira sessão não espera o aquecimento e disputa com ele apenas um cursor do pool.
+    # os recursos usados pelas páginas são criados aqui, na thread do script, e repassados à thread do aquecimento
+    recursos = {
+        "pool": get_pool(),
+        "result_cache": get_result_cache(),
+        "query_log": get_query_log(),
+        "agregados": get_agregados(),
+        "catalogo": get_catalogo(),
+    }
+    thread = threading.Thread(
+        target=run_warmup,
+        args=(recursos, read_paginas(WARMUP_FILE), WARMUP_QUERIES),
+        name="warmup",
+        daemon=True
+    )
+    thread.start()
+    return thread
 
 
 con = init_db_connection()
+# apenas no app: scripts como load_test.py e arrow_report.py medem o acesso ao banco sem o aquecimento
+if WARMUP and st.runtime.exists():
+    start_warmup()
@@ -0,0 +1,163 @@
+import argparse
+import importlib.util
+import json
+import logging
+import os
+import threading
+from collections import Counter
+from contextlib import contextmanager
+from time import monotonic, perf_counter
+from typing import Callable, Iterator
+
+import pyarrow as pa
+from result_cache import get_key
+
+logger = logging.getLogger(name="app - warmup")
+
+PAGES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "pages")
+
+
+class QueryLog:
+    # frequência de cada consulta (modelo + parâmetros) pedida pelas páginas, acumulada em disco entre processos e
+    # reinícios para priorizar o aquecimento; cada processo soma seus incrementos ao arquivo a cada flush_interval
+    # segundos, com escrita atômica e sem lock entre processos: incrementos simultâneos podem se perder, mas a
+    # ordem aproximada basta
+    def __init__(self, path: str | None, flush_interval: float = 60, max_entries: int = 1000) -> None:
+        self.path = path
+        self.flush_interval = flush_interval
+        self.max_entries = max_entries
+        self.pending = Counter()
+        self.queries: dict[str, tuple[str, dict]] = {}
+        self.last_flush = monotonic()
+        self.lock = threading.Lock()
+        self.local = threading.local()
+        if path:
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+
+    def record(self, query: str, parametros: dict | None) -> None:
+        if self.is_suspended():
+            return
+        key = get_key(query, parametros)
+        with self.lock:
+            self.pending[key] += 1
+            self.queries[key] = (query, parametros or {})
+            flush = self.path is not None and monotonic() - self.last_flush > self.flush_interval
+            if flush:
+                self.last_flush = monotonic()
+        if flush:
+            self.flush()
+
+    def is_suspended(self) -> bool:
+        return getattr(self.local, "suspended", False)
+
+    @contextmanager
+    def suspended(self) -> Iterator[None]:
+        # as consultas do próprio aquecimento não contam como uso
+        self.local.suspended = True
+        try:
+            yield
+        finally:
+            self.local.suspended = False
+
+    def read(self) -> dict[str, dict]:
+        if not self.path:
+            return {}
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):  # ainda não gravado ou substituído no meio da leitura
+            return {}
+
+    def merge(self, entries: dict[str, dict], pending: Counter, queries: dict[str, tuple[str, dict]]) -> dict:
+        for key, count in pending.items():
+            query, parametros = queries[key]
+            entry = entries.setdefault(key, {"query": query, "parametros": parametros, "count": 0})
+            entry["count"] += count
+        return dict(sorted(entries.items(), key=lambda item: item[1]["count"], reverse=True)[:self.max_entries])
+
+    def flush(self) -> None:
+        with self.lock:
+            pending, self.pending = self.pending, Counter()
+            queries, self.queries = self.queries, {}
+        if not pending or not self.path:
+            return
+        entries = self.merge(self.read(), pending, queries)
+        tmp = f"{self.path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(entries, f, ensure_ascii=False)
+        os.replace(tmp, self.path)
+
+    def get_most_frequent(self, limit: int) -> list[tuple[str, dict]]:
+        with self.lock:
+            pending, queries = Counter(self.pending), dict(self.queries)
+        entries = self.merge(self.read(), pending, queries)
+        return [(entry["query"], entry["parametros"]) for entry in list(entries.values())[:limit]]
+
+
+def load_page(name: str):
+    spec = importlib.util.spec_from_file_location(name, f"{PAGES}/{name}.py")
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def read_paginas(path: str) -> list[dict]:
+    # lista de {"pagina", "funcao", "parametros"}: a função da página chamada com os parâmetros de uma seleção
+    try:
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        logger.warning(f"{path} not found, warming up only the most frequent queries")
+        return []
+
+
+def warm_up(
+        run_query: Callable[[str, dict], pa.Table],
+        query_log: QueryLog,
+        paginas: list[dict],
+        limit: int
+) -> dict[str, float]:
+    # primeiro as seleções configuradas (a tela inicial de cada página), depois as consultas mais pedidas; as já
+    # presentes no cache de resultados custam apenas a leitura
+    start = perf_counter()
+    counters = Counter()
+    with query_log.suspended():
+        modules = {}
+        for item in paginas:
+            try:
+                if item["pagina"] not in modules:
+                    modules[item["pagina"]] = load_page(item["pagina"])
+                getattr(modules[item["pagina"]], item.get("funcao", "get_df"))(**item["parametros"])
+                counters["pages"] += 1
+            except Exception as e:  # seleção que deixou de existir não impede as demais
+                logger.warning(f"{item}: {e!r}")
+                counters["errors"] += 1
+        for query, parametros in query_log.get_most_frequent(limit):
+            try:
+                run_query(query, parametros)
+                counters["queries"] += 1
+            except Exception as e:  # consulta de uma versão anterior das páginas ou dos dados
+                logger.warning(f"{e!r}")
+                counters["errors"] += 1
+    stats = {**counters, "seconds": perf_counter() - start}
+    logger.info(f"Warm-up done | {stats}")
+    return stats
+
+
+def main(limit: int | None) -> None:
+    # etapa após o etl: preenche o cache em disco, compartilhado com os processos do app, para a versão atual dos dados
+    import utils
+
+    limit = utils.WARMUP_QUERIES if limit is None else limit
+    warm_up(utils.run_query, utils.get_query_log(), read_paginas(utils.WARMUP_FILE), limit)
+    logger.info(f"{utils.get_result_cache().get_stats()}")
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(
+        description="Preenche o cache de resultados com as seleções configuradas e as consultas mais frequentes"
+    )
+    parser.add_argument("--queries", type=int, help="consultas mais frequentes repetidas (EDUCENSO_WARMUP_QUERIES)")
+    args = parser.parse_args()
+    main(args.queries)
@@ -0,0 +1,101 @@
+import logging
+import os
+
+import duckdb
+import pyarrow.parquet as pq
+from pyarrow import dataset as ds
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(name="etl - catalog")
+
+FOLDER = "./data/transformed"
+TABLE = f"{FOLDER}/catalogo.parquet"
+
+# dimensões dos microdados listadas nos widgets: coluna -> (código do IBGE, dimensão pai); os níveis abaixo da UF
+# guardam a UF como pai, para que a lista de municípios (ou micro e mesorregiões) possa ser restringida a uma UF
+DIMENSOES = {
+    "NO_PAIS": (None, None),
+    "NO_REGIAO": ("CO_REGIAO", None),
+    "NO_UF": ("CO_UF", None),
+    "NO_MESORREGIAO": ("CO_MESORREGIAO", "NO_UF"),
+    "NO_MICRORREGIAO": ("CO_MICRORREGIAO", "NO_UF"),
+    "NO_MUNICIPIO": ("CO_MUNICIPIO", "NO_UF"),
+    "TP_DEPENDENCIA": (None, None),
+    "TP_LOCALIZACAO": (None, None),
+}
+
+
+def get_query_microdados() -> str:
+    # o cubo tem todas as combinações de dimensões dos microdados em bem menos linhas
+    selects = [
+        f"""
+        select distinct
+            'microdados' as FONTE,
+            '{dimensao}' as DIMENSAO,
+            null::varchar as NIVEL,
+            {dimensao}::varchar as VALOR,
+            {codigo or "null"}::integer as CODIGO,
+            {dimensao}::varchar as ROTULO,
+            {f"'{pai}'" if pai else "null"}::varchar as PAI_DIMENSAO,
+            {pai or "null"}::varchar as PAI_VALOR
+        from microdados_cubo
+        """
+        for dimensao, (codigo, pai) in DIMENSOES.items()
+    ]
+    return " union all ".join(selects)
+
+
+def get_query_indicadores() -> str:
+    # grupos e localidades de cada indicador, por nível geográfico; municípios homônimos são distinguidos no rótulo
+    # pela UF e identificados pelo código
+    return """
+        select distinct
+            SG_INDICADOR as FONTE,
+            'TP_GRUPO' as DIMENSAO,
+            null::varchar as NIVEL,
+            TP_GRUPO as VALOR,
+            null::integer as CODIGO,
+            TP_GRUPO as ROTULO,
+            null::varchar as PAI_DIMENSAO,
+            null::varchar as PAI_VALOR
+        from indicadores
+        union all
+        select distinct
+            i.SG_INDICADOR as FONTE,
+            'NO_LOCALIDADE_GEOGRAFICA' as DIMENSAO,
+            i.TP_LOCALIDADE_GEOGRAFICA as NIVEL,
+            i.NO_LOCALIDADE_GEOGRAFICA as VALOR,
+            case i.TP_LOCALIDADE_GEOGRAFICA
+                when 'Município' then i.CO_MUNICIPIO
+                when 'Unidade Federativa' then i.CO_UF
+            end as CODIGO,
+            case i.TP_LOCALIDADE_GEOGRAFICA
+                when 'Município' then i.NO_LOCALIDADE_GEOGRAFICA || coalesce(' - ' || g.SG_UF, '')
+                else i.NO_LOCALIDADE_GEOGRAFICA
+            end as ROTULO,
+            case when g.NO_UF is not null then 'NO_UF' end as PAI_DIMENSAO,
+            g.NO_UF as PAI_VALOR
+        from indicadores i
+        left join geografia g on i.TP_LOCALIDADE_GEOGRAFICA = 'Município' and g.CO_MUNICIPIO = i.CO_MUNICIPIO
+    """
+
+
+def main() -> None:
+    con = duckdb.connect()
+    con.register(
+        "microdados_cubo", ds.dataset(f"{FOLDER}/microdados_cubo.parquet", format="parquet", partitioning="hive")
+    )
+    con.register("indicadores", ds.dataset(f"{FOLDER}/indicadores.parquet", format="parquet", partitioning="hive"))
+    con.register("geografia", ds.dataset(f"{FOLDER}/geografia.parquet", format="parquet"))
+
+    table = con.execute(f"""
+        select * from ({get_query_microdados()} union all {get_query_indicadores()})
+        order by FONTE, DIMENSAO, NIVEL, ROTULO, PAI_VALOR
+    """).to_arrow_table()
+    pq.write_table(table, f"{TABLE}.tmp", compression="zstd", write_statistics=True)
+    os.replace(f"{TABLE}.tmp", TABLE)
+    logger.info(f"{table.num_rows} values in {TABLE}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+import hashlib
+import json
+import os
+import threading
+from contextlib import nullcontext
+from zipfile import ZipFile, BadZipfile
+
+import requests
+
+from manifest import load_manifest, save_manifest
+
+# download retomável dos zips do INEP, compartilhado pelos extracts dos microdados e dos indicadores: um .part
+# pendente é retomado com Range/If-Range, e um zip já baixado só é pedido de novo com If-None-Match/If-Modified-Since
+
+CHUNK_SIZE = 1 << 20
+
+manifest_lock = threading.Lock()
+
+
+def is_permanent_error(e: Exception) -> bool:
+    # 4xx não muda com novas tentativas (ex.: TRE 2022 ainda não publicado), exceto o 416 de um .part inválido,
+    # que é descartado antes da nova tentativa
+    return (
+        isinstance(e, requests.exceptions.HTTPError)
+        and (e.response is None or (e.response.status_code < 500 and e.response.status_code != 416))
+    )
+
+
+def save_manifest_entry(path: str, key: str, entry: dict) -> None:
+    with manifest_lock:
+        manifest = load_manifest(path)
+        manifest[key] = entry
+        save_manifest(path, manifest)
+
+
+def get_sha256(file: str) -> str:
+    sha256 = hashlib.sha256()
+    with open(file, "rb") as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b""):
+            sha256.update(chunk)
+    return sha256.hexdigest()
+
+
+def get_validators(headers: dict) -> dict:
+    return {"etag": headers.get("ETag"), "last_modified": headers.get("Last-Modified")}
+
+
+def get_request_headers(file: str, entry: dict | None) -> dict:
+    # um .part pendente é retomado de onde parou, desde que o arquivo no servidor não tenha mudado (If-Range);
+    # um zip completo e íntegro só é baixado de novo se mudou no servidor (If-None-Match/If-Modified-Since). O zip
+    # (centenas de MB nos microdados) só é lido para o sha256 se o tamanho confere com o manifesto
+    headers = {}
+    if os.path.isfile(f"{file}.part") and os.path.isfile(f"{file}.part.json"):
+        with open(f"{file}.part.json") as f:
+            validators = json.load(f)
+        if validators["etag"] or validators["last_modified"]:
+            headers["Range"] = f"bytes={os.path.getsize(f'{file}.part')}-"
+            headers["If-Range"] = validators["etag"] or validators["last_modified"]
+    elif (
+            entry and os.path.isfile(file) and os.path.getsize(file) == entry["size"]
+            and get_sha256(file) == entry["sha256"]
+    ):
+        if entry["etag"]:
+            headers["If-None-Match"] = entry["etag"]
+        if entry["last_modified"]:
+            headers["If-Modified-Since"] = entry["last_modified"]
+    return headers
+
+
+def remove_part(file: str) -> None:
+    for path in (f"{file}.part", f"{file}.part.json"):
+        if os.path.isfile(path):
+            os.remove(path)
+
+
+def make_request(
+        session: requests.Session,
+        url: str,
+        file: str,
+        entry: dict | None,
+        semaphore: threading.Semaphore | None = None
+) -> dict | None:
+    # retorna a nova entrada do manifesto, ou None se o arquivo não mudou no servidor; o semáforo, se houver, é
+    # mantido apenas durante a requisição
+    with semaphore or nullcontext():
+        with session.get(url, headers=get_request_headers(file, entry), stream=True, verify=False, timeout=600) as r:
+            if r.status_code == 304:
+                return None
+            if r.status_code == 416:
+                remove_part(file)
+            r.raise_for_status()
+            if r.status_code == 206:
+                mode = "ab"
+            else:
+                mode = "wb"
+                with open(f"{file}.part.json", "w") as f:
+                    json.dump(get_validators(r.headers), f)
+            with open(f"{file}.part", mode) as f:
+                for chunk in r.iter_content(chunk_size=CHUNK_SIZE):
+                    f.write(chunk)
+            validators = get_validators(r.headers)
+
+    try:
+        ZipFile(f"{file}.part", "r").close()
+    except BadZipfile:
+        remove_part(file)
+        raise
+    entry = {"url": url, **validators, "size": os.path.getsize(f"{file}.part"), "sha256": get_sha256(f"{file}.part")}
+    os.replace(f"{file}.part", file)
+    remove_part(file)
+    return entry
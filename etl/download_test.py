@@ -0,0 +1,370 @@
+import argparse
+import hashlib
+import importlib.util
+import io
+import itertools
+import json
+import logging
+import os
+import random
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from email.utils import formatdate
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from tempfile import TemporaryDirectory
+from typing import Callable, Iterator
+from urllib.parse import urlparse
+from zipfile import ZipFile
+
+import requests
+
+logger = logging.getLogger(name="etl - download test")
+
+ETL = os.path.dirname(os.path.abspath(__file__))
+
+# testes dos downloads contra um servidor http local que serve zips de teste e simula as falhas do servidor do INEP;
+# rodam com pytest ou direto: python etl/download_test.py
+
+
+def load_module(name: str, path: str):
+    spec = importlib.util.spec_from_file_location(name, f"{ETL}/{path}")
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+indicadores_extract = load_module("indicadores_extract", "indicadores/extract.py")
+microdados_extract = load_module("microdados_extract", "microdados/extract.py")
+sys.path.append(ETL)
+import download  # noqa: E402
+
+
+def get_zip(name: str, size: int = 0) -> bytes:
+    # size bytes aleatórios (sem compressão) para zips maiores que o bloco lido pelo download
+    buffer = io.BytesIO()
+    with ZipFile(buffer, "w") as zip:
+        zip.writestr(f"{name}.xlsx", f"conteúdo de {name}" * 100)
+        if size:
+            zip.writestr(f"{name}.csv", random.Random(name).randbytes(size))
+    return buffer.getvalue()
+
+
+class Server(ThreadingHTTPServer):
+    # zips por caminho e falhas programadas por caminho, uma consumida a cada requisição: "503" e "404" respondem
+    # com o erro, "drop" fecha a conexão na metade do corpo e "drop-change" também troca o zip no servidor;
+    # atende Range/If-Range e pedidos condicionais, e registra as requisições e o máximo de requisições simultâneas
+    daemon_threads = True
+
+    def __init__(self, files: dict[str, bytes], faults: dict[str, list[str]] | None = None, delay: float = 0) -> None:
+        super().__init__(("127.0.0.1", 0), Handler)
+        self.files = files
+        self.faults = faults or {}
+        self.delay = delay
+        self.requests = []
+        self.active = 0
+        self.max_active = 0
+        self.lock = threading.Lock()
+
+    @property
+    def base_url(self) -> str:
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+    def get_etag(self, path: str) -> str:
+        return f'"{hashlib.sha256(self.files[path]).hexdigest()[:16]}"'
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format: str, *args) -> None:
+        logger.debug(format % args)
+
+    def do_GET(self) -> None:
+        server = self.server
+        with server.lock:
+            server.requests.append((self.path, dict(self.headers)))
+            server.active += 1
+            server.max_active = max(server.max_active, server.active)
+            faults = server.faults.get(self.path)
+            fault = faults.pop(0) if faults else None
+        # a requisição deixa de contar antes da resposta: o cliente só libera a vaga depois de recebê-la, então a
+        # contagem nunca passa do número real de requisições simultâneas
+        time.sleep(server.delay)
+        with server.lock:
+            server.active -= 1
+        self.respond(fault)
+
+    def respond(self, fault: str | None) -> None:
+        if fault in {"404", "503"}:
+            self.send_error(int(fault))
+            return
+        if self.path not in self.server.files:
+            self.send_error(404)
+            return
+        content = self.server.files[self.path]
+        etag, last_modified = self.server.get_etag(self.path), formatdate(0, usegmt=True)
+        if "Range" not in self.headers and (
+                self.headers.get("If-None-Match") == etag
+                or ("If-None-Match" not in self.headers and self.headers.get("If-Modified-Since") == last_modified)
+        ):
+            self.send_response(304)
+            self.send_header("ETag", etag)
+            self.end_headers()
+            return
+
+        start = 0
+        if "Range" in self.headers and self.headers.get("If-Range") in {etag, last_modified}:
+            start = int(self.headers["Range"].removeprefix("bytes=").removesuffix("-"))
+            if start >= len(content):
+                self.send_response(416)
+                self.send_header("Content-Range", f"bytes */{len(content)}")
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return
+            self.send_response(206)
+            self.send_header("Content-Range", f"bytes {start}-{len(content) - 1}/{len(content)}")
+        else:
+            self.send_response(200)
+        body = content[start:]
+        self.send_header("Content-Type", "application/zip")
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("ETag", etag)
+        self.send_header("Last-Modified", last_modified)
+        self.end_headers()
+        if fault in {"drop", "drop-change"}:
+            self.wfile.write(body[:len(body) // 2])
+            self.wfile.flush()
+            self.close_connection = True
+            if fault == "drop-change":
+                self.server.files[self.path] = get_zip(f"{self.path} v2", len(content))
+            return
+        self.wfile.write(body)
+
+
+@contextmanager
+def serve(files: dict[str, bytes], faults: dict[str, list[str]] | None = None, delay: float = 0) -> Iterator[Server]:
+    server = Server(files, faults, delay)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        yield server
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+@contextmanager
+def workdir() -> Iterator[str]:
+    # os scripts gravam em ./data a partir do diretório atual
+    cwd = os.getcwd()
+    with TemporaryDirectory() as folder:
+        os.chdir(folder)
+        try:
+            yield folder
+        finally:
+            os.chdir(cwd)
+
+
+def get_path(url: str) -> str:
+    return urlparse(url).path
+
+
+def get_indicadores_files(years: range, indicadores: list[str], bases: list[str]) -> dict[str, bytes]:
+    files = {}
+    for year, indicador, base in itertools.product(years, indicadores, bases):
+        path = get_path(indicadores_extract.get_url(indicador, base, year, "http://host"))
+        files[path] = get_zip(path)
+    return files
+
+
+def read(path: str) -> bytes:
+    with open(path, "rb") as f:
+        return f.read()
+
+
+def test_concurrency_limit_per_host() -> None:
+    # dois servidores (hosts distintos para o limite): cada um recebe no máximo MAX_CONNECTIONS_PER_HOST
+    # requisições simultâneas, mas os dois juntos passam disso
+    files = get_indicadores_files(range(2016, 2022), ["AFD", "IED", "ATU", "HAD"], ["MUNICIPIOS", "BRASIL_REGIOES_UFS"])
+    tasks = list(itertools.product(range(2016, 2022), ["AFD", "IED", "ATU", "HAD"], ["MUNICIPIOS", "BRASIL_REGIOES_UFS"]))
+    with workdir(), serve(files, delay=0.05) as a, serve(files, delay=0.05) as b:
+        with ThreadPoolExecutor(max_workers=16) as executor:
+            futures = [
+                executor.submit(indicadores_extract.download_file, year, indicador, base, server.base_url)
+                for (year, indicador, base), server in zip(tasks, itertools.cycle([a, b]))
+            ]
+            assert all(future.result() for future in futures)
+        for server in (a, b):
+            assert 1 < server.max_active <= indicadores_extract.MAX_CONNECTIONS_PER_HOST, server.max_active
+        for year, indicador, base in tasks:
+            path = get_path(indicadores_extract.get_url(indicador, base, year, "http://host"))
+            assert read(f"./data/raw/{indicador}/{base}/zips/{year}.zip") == files[path]
+        logger.info(f"Max simultaneous requests per host: {a.max_active} and {b.max_active}")
+
+
+def test_main_concurrency_limit() -> None:
+    # o main com mais workers que o limite: um único host, TRE 2022 registrado como falha sem requisição
+    indicadores = ["TRE", "AFD", "IED", "ATU", "HAD", "DSU", "TDI"]
+    bases = ["MUNICIPIOS", "BRASIL_REGIOES_UFS"]
+    files = get_indicadores_files(range(2016, 2022), indicadores, bases)
+    files |= get_indicadores_files(range(2022, 2023), indicadores[1:], bases)
+    with workdir(), serve(files, delay=0.02) as server:
+        indicadores_extract.main(workers=16, base_url=server.base_url, unzip=True)
+        assert 1 < server.max_active <= indicadores_extract.MAX_CONNECTIONS_PER_HOST, server.max_active
+        assert len(server.requests) == len(files)
+        assert os.path.isfile("./data/raw/TDI/MUNICIPIOS/2022.xlsx")
+        assert not os.path.exists("./data/raw/TRE/MUNICIPIOS/zips/2022.zip")
+
+
+def test_retry_with_backoff() -> None:
+    # erros 5xx são transitórios: o download é repetido com espera exponencial até dar certo
+    files = get_indicadores_files(range(2020, 2021), ["AFD"], ["MUNICIPIOS"])
+    path = next(iter(files))
+    with workdir(), serve(files, faults={path: ["503", "503"]}) as server:
+        start = time.perf_counter()
+        assert indicadores_extract.download_file(2020, "AFD", "MUNICIPIOS", server.base_url)
+        assert [request for request, _ in server.requests] == [path] * 3
+        assert read("./data/raw/AFD/MUNICIPIOS/zips/2020.zip") == files[path]
+        logger.info(f"Retried twice in {time.perf_counter() - start:.1f}s")
+
+
+def test_giveup_on_permanent_error() -> None:
+    # 4xx não muda com novas tentativas: desiste na primeira resposta, sem deixar arquivos parciais
+    with workdir(), serve({}) as server:
+        try:
+            indicadores_extract.download_file(2020, "AFD", "MUNICIPIOS", server.base_url)
+            raise AssertionError("404 did not raise")
+        except requests.exceptions.HTTPError as e:
+            assert e.response.status_code == 404
+        assert len(server.requests) == 1
+        assert os.listdir("./data/raw/AFD/MUNICIPIOS/zips") == []
+
+
+def test_giveup_after_max_tries() -> None:
+    # erro transitório que persiste: desiste após max_tries tentativas
+    files = get_indicadores_files(range(2020, 2021), ["AFD"], ["MUNICIPIOS"])
+    path = next(iter(files))
+    with workdir(), serve(files, faults={path: ["503"] * 10}) as server:
+        try:
+            indicadores_extract.download_file(2020, "AFD", "MUNICIPIOS", server.base_url)
+            raise AssertionError("503 did not raise")
+        except requests.exceptions.HTTPError as e:
+            assert e.response.status_code == 503
+        assert len(server.requests) == 5
+
+
+def download_microdados(server: Server, year: int = 2020) -> bool:
+    return microdados_extract.download_file(year, server.base_url)
+
+
+def get_microdados_files(size: int) -> dict[str, bytes]:
+    path = "/dados_abertos/microdados_censo_escolar_2020.zip"
+    return {path: get_zip(path, size)}
+
+
+def test_resume_after_dropped_connection() -> None:
+    # a conexão cai na metade: a nova tentativa pede só o restante (Range + If-Range) e o zip final é íntegro
+    files = get_microdados_files(3 * download.CHUNK_SIZE)
+    path = next(iter(files))
+    with workdir(), serve(files, faults={path: ["drop"]}) as server:
+        assert download_microdados(server)
+        (_, first), (_, second) = server.requests
+        assert "Range" not in first
+        received = int(second["Range"].removeprefix("bytes=").removesuffix("-"))
+        assert 0 < received < len(files[path]) and second["If-Range"] == server.get_etag(path)
+        assert read("./data/raw/microdados/zips/2020.zip") == files[path]
+        assert not os.path.exists("./data/raw/microdados/zips/2020.zip.part")
+        entry = download.load_manifest(microdados_extract.MANIFEST)["2020"]
+        assert entry["sha256"] == hashlib.sha256(files[path]).hexdigest() and entry["size"] == len(files[path])
+        logger.info(f"Resumed from byte {received} of {len(files[path])}")
+
+
+def test_restart_when_changed_during_resume() -> None:
+    # o zip mudou no servidor entre a queda e a nova tentativa: o If-Range não confere e o download recomeça
+    files = get_microdados_files(3 * download.CHUNK_SIZE)
+    path = next(iter(files))
+    with workdir(), serve(files, faults={path: ["drop-change"]}) as server:
+        original = files[path]
+        assert download_microdados(server)
+        assert len(server.requests) == 2 and "Range" in server.requests[1][1]
+        assert files[path] != original
+        assert read("./data/raw/microdados/zips/2020.zip") == files[path]
+
+
+def test_invalid_part_is_discarded() -> None:
+    # .part maior que o zip no servidor (416): é descartado e o zip é baixado inteiro
+    files = get_microdados_files(0)
+    path = next(iter(files))
+    with workdir(), serve(files) as server:
+        os.makedirs("./data/raw/microdados/zips")
+        with open("./data/raw/microdados/zips/2020.zip.part", "wb") as f:
+            f.write(b"x" * (len(files[path]) + 10))
+        with open("./data/raw/microdados/zips/2020.zip.part.json", "w") as f:
+            json.dump({"etag": server.get_etag(path), "last_modified": None}, f)
+        assert download_microdados(server)
+        assert len(server.requests) == 2 and "Range" not in server.requests[1][1]
+        assert read("./data/raw/microdados/zips/2020.zip") == files[path]
+
+
+def test_not_modified() -> None:
+    # zip inalterado no servidor: pedido condicional com 304, sem corpo e sem regravar o arquivo
+    files = get_microdados_files(0)
+    path = next(iter(files))
+    with workdir(), serve(files) as server:
+        assert download_microdados(server)
+        modified = os.path.getmtime("./data/raw/microdados/zips/2020.zip")
+        assert not download_microdados(server)
+        assert server.requests[1][1]["If-None-Match"] == server.get_etag(path)
+        assert os.path.getmtime("./data/raw/microdados/zips/2020.zip") == modified
+
+
+def test_size_checked_before_hash() -> None:
+    # zip local de tamanho diferente do manifesto: baixado de novo sem calcular o sha256 do arquivo local
+    files = get_microdados_files(0)
+    hashed = []
+    get_sha256 = download.get_sha256
+    download.get_sha256 = lambda file: hashed.append(file) or get_sha256(file)
+    try:
+        with workdir(), serve(files) as server:
+            assert download_microdados(server)
+            hashed.clear()
+            with open("./data/raw/microdados/zips/2020.zip", "ab") as f:
+                f.write(b"corrompido")
+            assert download_microdados(server)
+            assert "If-None-Match" not in server.requests[1][1]
+            assert hashed == ["./data/raw/microdados/zips/2020.zip.part"]
+    finally:
+        download.get_sha256 = get_sha256
+
+
+TESTS: dict[str, Callable[[], None]] = {
+    name: test for name, test in globals().items() if name.startswith("test_") and callable(test)
+}
+
+
+def main(names: list[str] | None) -> None:
+    failures = []
+    for name, test in TESTS.items():
+        if names and name not in names:
+            continue
+        try:
+            test()
+            logger.info(f"{name}: ok")
+        except Exception:
+            logger.exception(f"{name}: failed")
+            failures.append(name)
+    if failures:
+        raise SystemExit(f"Failed: {failures}")
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(
+        description="Testa os downloads contra um servidor http local com zips de teste e falhas simuladas"
+    )
+    parser.add_argument("tests", nargs="*", help=f"testes a executar (padrão: todos): {', '.join(TESTS)}")
+    args = parser.parse_args()
+    main(args.tests)
@@ -1,87 +1,123 @@
+import argparse
 import itertools
 import logging
 import os
+import shutil
+import sys
+import threading
 import warnings
-from shutil import rmtree
-from time import sleep
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from time import perf_counter
+from urllib.parse import urlparse
 from zipfile import ZipFile, BadZipfile
 
 import backoff
 import requests
+from requests.adapters import HTTPAdapter
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from download import CHUNK_SIZE, is_permanent_error, make_request, save_manifest_entry  # noqa: E402
+from manifest import load_manifest  # noqa: E402
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger("indicadores - extraction")
 
 warnings.filterwarnings("ignore")
 
+BASE_URL = "https://download.inep.gov.br"
+MAX_CONNECTIONS_PER_HOST = 4
+MANIFEST = "./data/raw/indicadores.manifest.json"
+
+# cada thread mantém sua sessão com conexões keep-alive; o semáforo limita as conexões simultâneas por host
+sessions = threading.local()
+host_semaphores = {}
+host_semaphores_lock = threading.Lock()
+
 
-def get_url(indicador: str, base: str, year: int) -> str:
+def get_url(indicador: str, base: str, year: int, base_url: str = BASE_URL) -> str:
     if indicador in {"AFD"}:
         base = base.replace("UFS", "UF")
     if indicador == "TRE":
         if year in {2016, 2017}:
-            url = f"https://download.inep.gov.br/informacoes_estatisticas/indicadores_educacionais/{year}/TAXA_REND_{year}_{base.upper()}.zip"
+            url = f"{base_url}/informacoes_estatisticas/indicadores_educacionais/{year}/TAXA_REND_{year}_{base.upper()}.zip"
         elif year == 2018:
-            url = f"https://download.inep.gov.br/informacoes_estatisticas/indicadores_educacionais/2018/TX_REND_{base.upper()}_2018.zip"
+            url = f"{base_url}/informacoes_estatisticas/indicadores_educacionais/2018/TX_REND_{base.upper()}_2018.zip"
         elif year in range(2019, 2022):
-            url = f"https://download.inep.gov.br/informacoes_estatisticas/indicadores_educacionais/{year}/tx_rend_{base.lower()}_{year}.zip"
+            url = f"{base_url}/informacoes_estatisticas/indicadores_educacionais/{year}/tx_rend_{base.lower()}_{year}.zip"
         else:  # TRE 2022 ainda não está disponível
             raise requests.exceptions.HTTPError(f"{indicador}/{year}")
     else:
-        url = f"https://download.inep.gov.br/informacoes_estatisticas/indicadores_educacionais/{year}/{indicador}_{year}_{base.upper()}.zip"
+        url = f"{base_url}/informacoes_estatisticas/indicadores_educacionais/{year}/{indicador}_{year}_{base.upper()}.zip"
     return url
 
 
-@backoff.on_exception(
-    backoff.expo,
-    requests.exceptions.RequestException,
-    max_tries=2
-)
-def make_request(year: int, indicador: str, base: str) -> None:
-    url = get_url(indicador, base, year)
-    os.makedirs(f"./data/raw/{indicador}/{base}/zips", exist_ok=True)
-    with requests.get(url, stream=True, verify=False, timeout=600) as r:
-        r.raise_for_status()
-        with open(f"./data/raw/{indicador}/{base}/zips/{year}.zip", "wb") as f:
-            for chunk in r.iter_content(chunk_size=8192):
-                f.write(chunk)
-
+def get_session() -> requests.Session:
+    if not hasattr(sessions, "session"):
+        sessions.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=MAX_CONNECTIONS_PER_HOST)
+        sessions.session.mount("http://", adapter)
+        sessions.session.mount("https://", adapter)
+    return sessions.session
 
-def test_zip(year: int, indicador: str, base: str) -> None:
-    ZipFile(f"./data/raw/{indicador}/{base}/zips/{year}.zip", "r")
 
+def get_host_semaphore(url: str) -> threading.Semaphore:
+    host = urlparse(url).netloc
+    with host_semaphores_lock:
+        if host not in host_semaphores:
+            host_semaphores[host] = threading.Semaphore(MAX_CONNECTIONS_PER_HOST)
+        return host_semaphores[host]
 
-def download_file(year: int, indicador: str, base: str) -> None:
-    logger.info(f"Downloading {indicador}/{base}/{year}")
-    try:
-        make_request(year, indicador, base)
-        test_zip(year, indicador, base)
 
-    #  pode acontecer do zip não ser baixado corretamente
-    except (requests.exceptions.ChunkedEncodingError, BadZipfile):
-        sleep(100)
-        if f"./data/raw/{indicador}/{base}/zips/{year}.zip" in os.listdir():
-            os.remove(f"./data/raw/{indicador}/{base}/zips/{year}.zip")
-        make_request(year, indicador, base)
-        test_zip(year, indicador, base)
+#  pode acontecer do zip não ser baixado corretamente; cada arquivo repete apenas o próprio download, retomando o
+#  .part quando o servidor aceita Range
+@backoff.on_exception(
+    backoff.expo,
+    (requests.exceptions.RequestException, BadZipfile),
+    max_tries=5,
+    giveup=is_permanent_error
+)
+def download_file(year: int, indicador: str, base: str, base_url: str = BASE_URL) -> bool:
+    url = get_url(indicador, base, year, base_url)
+    key = f"{indicador}/{base}/{year}"
+    logger.info(f"Downloading {key}")
+    os.makedirs(f"./data/raw/{indicador}/{base}/zips", exist_ok=True)
+    entry = make_request(
+        get_session(), url, f"./data/raw/{indicador}/{base}/zips/{year}.zip", load_manifest(MANIFEST).get(key),
+        get_host_semaphore(url)
+    )
+    if entry is None:
+        logger.info(f"{key} not modified")
+        return False
+    save_manifest_entry(MANIFEST, key, entry)
+    return True
 
 
 def unzip_file(year: int, indicador: str, base: str) -> None:
+    # apenas a planilha é extraída, gravada uma única vez já com o nome final
     logger.debug("Unzipping")
-    folder = f"data/raw/{indicador}/{base}/{year}"
+    file = f"./data/raw/{indicador}/{base}/{year}.xlsx"
     with ZipFile(f"./data/raw/{indicador}/{base}/zips/{year}.zip", "r") as zip:
         excel_file = [file for file in zip.namelist() if "xlsx" in file.lower()]
-        zip.extractall(folder, members=excel_file)
-        os.rename(
-            f"{folder}/{excel_file[0]}",
-            f"{folder}.xlsx"
-        )
-        rmtree(folder)
-
+        with zip.open(excel_file[0]) as source, open(f"{file}.tmp", "wb") as destination:
+            shutil.copyfileobj(source, destination, CHUNK_SIZE)
+    os.replace(f"{file}.tmp", file)
     logger.debug("Unzip complete")
 
 
-if __name__ == "__main__":
+def extract(year: int, indicador: str, base: str, base_url: str, unzip: bool) -> float:
+    start = perf_counter()
+    changed = download_file(year, indicador, base, base_url)
+    if not unzip:
+        # o transform lê a planilha direto do zip; uma planilha extraída antes ficaria desatualizada e teria
+        # precedência
+        if os.path.isfile(f"./data/raw/{indicador}/{base}/{year}.xlsx"):
+            os.remove(f"./data/raw/{indicador}/{base}/{year}.xlsx")
+    elif changed or not os.path.isfile(f"./data/raw/{indicador}/{base}/{year}.xlsx"):
+        unzip_file(year, indicador, base)
+    return perf_counter() - start
+
+
+def main(workers: int = 8, base_url: str = BASE_URL, unzip: bool = True) -> None:
     indicadores = {
         "TRE": "Taxa de Rendimento Escolar",
         "AFD": "Adequação da Formação Docente",
@@ -92,10 +128,31 @@ if __name__ == "__main__":
         "TDI": "Taxa de Distorção Idade-série",
     }
     bases = ["MUNICIPIOS", "BRASIL_REGIOES_UFS"]
-    for year, indicador, base in itertools.product(range(2016, 2023), indicadores, bases):
-        try:
-            download_file(year, indicador, base)
-        except requests.exceptions.HTTPError:  # para ignorar TRE 2022 cujo dataset ainda não existe
-            logger.error(f"Download {indicador}/{year} failed")
-            continue
-        unzip_file(year, indicador, base)
+    start = perf_counter()
+    durations, failures = {}, {}
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = {
+            executor.submit(extract, year, indicador, base, base_url, unzip): f"{indicador}/{base}/{year}"
+            for year, indicador, base in itertools.product(range(2016, 2023), indicadores, bases)
+        }
+        for future in as_completed(futures):
+            task = futures[future]
+            try:
+                durations[task] = future.result()
+            except (requests.exceptions.RequestException, BadZipfile) as e:  # ex.: TRE 2022 ainda não existe
+                logger.error(f"Download {task} failed: {e!r}")
+                failures[task] = e
+
+    logger.info(f"{len(durations)} files in {perf_counter() - start:.1f}s with {workers} workers")
+    if failures:
+        logger.error(f"Failed downloads: {sorted(failures)}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--workers", type=int, default=8, help="downloads simultâneos")
+    parser.add_argument("--base-url", default=BASE_URL, help="servidor de origem dos zips")
+    parser.add_argument("--no-unzip", action="store_true",
+                        help="mantém apenas os zips; o transform lê as planilhas direto deles")
+    args = parser.parse_args()
+    main(args.workers, args.base_url, unzip=not args.no_unzip)
@@ -1,10 +1,22 @@
+import argparse
+import hashlib
 import json
 import logging
 import os
+import sys
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from io import BytesIO
 from shutil import rmtree
+from time import perf_counter
 import warnings
+from zipfile import ZipFile
 
 import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from manifest import get_code_version, get_file_info, load_manifest, save_manifest  # noqa: E402
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(name="indicadores - transform")
@@ -25,36 +37,106 @@ INDICADORES = {
     "TAB": "Taxa de Abandono",  # TRE
 }
 
+# o TRE traz as três taxas lado a lado, em blocos de 18 colunas
+TRE = {"TAP": 0, "TRP": 1, "TAB": 2}
+
+# planilhas de origem e os indicadores que saem de cada uma
+PLANILHAS = {indicador: [indicador] for indicador in INDICADORES if indicador not in TRE} | {"TRE": list(TRE)}
+
+YEARS = range(2016, 2023)
+
+# códigos do IBGE das unidades da federação, para ligar as linhas de UF da base BRASIL_REGIOES_UFS, que só trazem o
+# nome, à tabela de geografia; nas linhas de município o código da UF são os dois primeiros dígitos do município
+UFS = {
+    "Rondônia": 11, "Acre": 12, "Amazonas": 13, "Roraima": 14, "Pará": 15, "Amapá": 16, "Tocantins": 17,
+    "Maranhão": 21, "Piauí": 22, "Ceará": 23, "Rio Grande do Norte": 24, "Paraíba": 25, "Pernambuco": 26,
+    "Alagoas": 27, "Sergipe": 28, "Bahia": 29, "Minas Gerais": 31, "Espírito Santo": 32, "Rio de Janeiro": 33,
+    "São Paulo": 35, "Paraná": 41, "Santa Catarina": 42, "Rio Grande do Sul": 43, "Mato Grosso do Sul": 50,
+    "Mato Grosso": 51, "Goiás": 52, "Distrito Federal": 53,
+}
+
+BASES = ["MUNICIPIOS", "BRASIL_REGIOES_UFS"]
+
+# layout do dataset: um único dataset em formato longo, particionado por indicador, ano e tipo de localidade,
+# com as linhas de cada arquivo agrupadas por localidade para que as consultas filtradas por localidade e
+# categoria descartem quase todos os row groups pelas estatísticas min/max e pelos bloom filters
+SORT_COLUMNS = ["NO_LOCALIDADE_GEOGRAFICA", "NO_CATEGORIA", "NO_DEPENDENCIA", "TP_GRUPO"]
+ROW_GROUP_SIZE = 16_384
+BLOOM_FILTER_COLUMNS = {"NO_LOCALIDADE_GEOGRAFICA": 6_000}
+
+DATASET = "./data/transformed/indicadores.parquet"
+MANIFEST = "./data/transformed/indicadores.manifest.json"
+# arquivos cuja mudança invalida as partições já transformadas
+CODE_FILES = [__file__, "./etl/indicadores/map_indicadores.json"]
+# layout anterior, um dataset por indicador
+LEGACY_FOLDER = "./data/transformed/indicadores"
+# planilhas já lidas, em arrow, reaproveitadas entre execuções enquanto o xlsx e os parâmetros de leitura não mudam
+CACHE = "./data/cache/indicadores"
+
 with open("./etl/indicadores/map_indicadores.json") as f:
     MAP_INDICADORES = json.load(f)
 
 
-def load_dataframe(indicador: str, year: int, base: str) -> pd.DataFrame:
-    if indicador in {"TAP", "TRP", "TAB"}:
-        file = f"./data/raw/TRE/{base}/{year}.xlsx"
-    else:
-        file = f"./data/raw/{indicador}/{base}/{year}.xlsx"
+def get_file(indicador: str, year: int, base: str) -> str:
+    folder = "TRE" if indicador in TRE else indicador
+    # a planilha extraída tem precedência; sem ela, a planilha é lida direto do zip baixado
+    if os.path.isfile(f"./data/raw/{folder}/{base}/{year}.xlsx"):
+        return f"./data/raw/{folder}/{base}/{year}.xlsx"
+    return f"./data/raw/{folder}/{base}/zips/{year}.zip"
+
+
+def open_file(file: str) -> str | BytesIO:
+    if not file.endswith(".zip"):
+        return file
+    # o openpyxl precisa de acesso aleatório à planilha, então o membro é descomprimido em memória, sem passar pelo
+    # disco
+    with ZipFile(file) as zip:
+        excel_file = [name for name in zip.namelist() if "xlsx" in name.lower()]
+        return BytesIO(zip.read(excel_file[0]))
+
+
+def read_excel(file: str, skiprows: int, engine: str) -> pd.DataFrame:
+    params = {"skiprows": skiprows, "skipfooter": 6, "na_values": ["--"], "engine": engine}
+    key = hashlib.sha256(json.dumps([get_file_info(file)["sha256"], params]).encode()).hexdigest()
+    cache_file = f"{CACHE}/{key}.arrow"
+    if os.path.isfile(cache_file):
+        with pa.memory_map(cache_file) as source:
+            return pa.ipc.open_file(source).read_pandas()
+
+    df = pd.read_excel(open_file(file), **params)
+    try:
+        table = pa.Table.from_pandas(df, preserve_index=False)
+    except (pa.ArrowInvalid, pa.ArrowTypeError) as e:  # colunas com tipos misturados não têm representação em arrow
+        logger.warning(f"{file} not cached: {e}")
+        return df
+    os.makedirs(CACHE, exist_ok=True)
+    with pa.OSFile(f"{cache_file}.{os.getpid()}.tmp", "wb") as sink:
+        with pa.ipc.new_file(sink, table.schema, options=pa.ipc.IpcWriteOptions(compression="zstd")) as writer:
+            writer.write_table(table)
+    os.replace(f"{cache_file}.{os.getpid()}.tmp", cache_file)
+    return table.to_pandas()
+
+
+def load_dataframes(planilha: str, year: int, base: str, engine: str = "openpyxl") -> dict[str, pd.DataFrame]:
+    file = get_file(planilha, year, base)
     if not os.path.isfile(file):
         raise FileNotFoundError(file)
-    match indicador:
+    match planilha:
         case "ATU" | "HAD" | "TDI":
-            df = pd.read_excel(file, skiprows=8, skipfooter=6, na_values=["--"])
-        case "TAP" | "TRP" | "TAB":
-            df = pd.read_excel(file, skiprows=8, skipfooter=6, na_values=["--"])
+            df = read_excel(file, skiprows=8, engine=engine)
+        case "TRE":
+            # a planilha é lida uma única vez e dividida entre TAP, TRP e TAB
+            df = read_excel(file, skiprows=8, engine=engine)
             offset = 7 if base == "MUNICIPIOS" else 4
-            match indicador:
-                case "TAP":
-                    df = pd.concat([df.iloc[:, :offset], df.iloc[:, offset+(18*0):offset+(18*1)]], axis=1)
-                case "TRP":
-                    df = pd.concat([df.iloc[:, :offset], df.iloc[:, offset+(18*1):offset+(18*2)]], axis=1)
-                case "TAB":
-                    df = pd.concat([df.iloc[:, :offset], df.iloc[:, offset+(18*2):offset+(18*3)]], axis=1)
-
+            return {
+                indicador: pd.concat([df.iloc[:, :offset], df.iloc[:, offset+(18*k):offset+(18*(k+1))]], axis=1)
+                for indicador, k in TRE.items()
+            }
         case "DSU":
-            df = pd.read_excel(file, skiprows=9, skipfooter=6, na_values=["--"])
+            df = read_excel(file, skiprows=9, engine=engine)
         case _:
-            df = pd.read_excel(file, skiprows=10, skipfooter=6, na_values=["--"])
-    return df
+            df = read_excel(file, skiprows=10, engine=engine)
+    return {planilha: df}
 
 
 def transform_dataframe(df_municipios: pd.DataFrame, df_brasil: pd.DataFrame, indicador: str) -> pd.DataFrame:
@@ -78,9 +160,15 @@ def get_tipo_localidade_geografica(localidade_geografica: str) -> str:
         return "Unidade Federativa"
 
 
+def get_codigo_uf(localidade_geografica: str) -> int | None:
+    codigos = {nome.lower(): codigo for nome, codigo in UFS.items()}
+    return codigos.get(localidade_geografica.strip().lower())
+
+
 def get_renamed_and_news_columns(df: pd.DataFrame, indicador: str, base: str) -> pd.DataFrame:
-    # drop
+    # drop; o código do município é mantido para as junções por código com a geografia e os mapas
     if base == "MUNICIPIOS":
+        codigos_municipios = df[df.columns[3]]
         df = df.drop(df.columns[[1, 2, 3]], axis=1)
 
     # renamed columns
@@ -96,19 +184,28 @@ def get_renamed_and_news_columns(df: pd.DataFrame, indicador: str, base: str) ->
     # new columns
     if base == "MUNICIPIOS":
         df.insert(2, "TP_LOCALIDADE_GEOGRAFICA", "Município")
+        df.insert(3, "CO_UF", codigos_municipios // 100_000)
+        df.insert(4, "CO_MUNICIPIO", codigos_municipios)
     else:
         df.insert(
             2,
             "TP_LOCALIDADE_GEOGRAFICA",
             df["NO_LOCALIDADE_GEOGRAFICA"].apply(get_tipo_localidade_geografica)
         )
+        codigos_ufs = df["NO_LOCALIDADE_GEOGRAFICA"].apply(get_codigo_uf)
+        sem_codigo = df.loc[(df["TP_LOCALIDADE_GEOGRAFICA"] == "Unidade Federativa") & codigos_ufs.isna(),
+                            "NO_LOCALIDADE_GEOGRAFICA"].unique()
+        if len(sem_codigo):
+            logger.warning(f"{indicador}: UFs sem código {list(sem_codigo)}")
+        df.insert(3, "CO_UF", codigos_ufs)
+        df.insert(4, "CO_MUNICIPIO", None)
 
     return df
 
 
 def get_melted_dataframe(df: pd.DataFrame) -> pd.DataFrame:
-    id_vars = df.columns[:5]
-    value_vars = df.columns[5:]
+    id_vars = df.columns[:7]
+    value_vars = df.columns[7:]
     df = df.melt(id_vars=id_vars, value_vars=value_vars, var_name="TP_GRUPO", value_name="METRICA")
     return df
 
@@ -116,38 +213,146 @@ def get_melted_dataframe(df: pd.DataFrame) -> pd.DataFrame:
 def get_dataframe_with_forced_schema(df: pd.DataFrame) -> pd.DataFrame:
     integer_columns = ["NU_ANO_CENSO"]
     df[integer_columns] = df[integer_columns].astype("int32")
+    # sem código nas linhas de país e região, e sem município nas linhas de UF
+    df[["CO_UF", "CO_MUNICIPIO"]] = df[["CO_UF", "CO_MUNICIPIO"]].astype("Int32")
     df["METRICA"] = df["METRICA"].astype("float")
     return df
 
 
-def save_dataframe(df: pd.DataFrame, indicador: str) -> None:
-    folder = f"./data/transformed/indicadores/{indicador}.parquet"
-    df.to_parquet(
-        folder,
-        engine="pyarrow",
-        compression="snappy",
-        index=None,
-        partition_cols=["NU_ANO_CENSO"]
-    )
+def save_dataframe(df: pd.DataFrame, folder: str) -> None:
+    # folder é a partição SG_INDICADOR=.../NU_ANO_CENSO=...; cada tipo de localidade vira uma subpartição
+    df = df.drop(columns=["NU_ANO_CENSO"])
+    for tipo_localidade, df_localidade in df.groupby("TP_LOCALIDADE_GEOGRAFICA"):
+        folder_localidade = f"{folder}/TP_LOCALIDADE_GEOGRAFICA={tipo_localidade}"
+        os.makedirs(folder_localidade, exist_ok=True)
+        df_localidade = df_localidade.drop(columns=["TP_LOCALIDADE_GEOGRAFICA"]).sort_values(SORT_COLUMNS, kind="stable")
+        table = pa.Table.from_pandas(df_localidade, preserve_index=False)
+        pq.write_table(
+            table,
+            f"{folder_localidade}/part-0.parquet",
+            row_group_size=ROW_GROUP_SIZE,
+            compression="zstd",
+            use_dictionary=True,
+            write_statistics=True,
+            write_page_index=True,
+            sorting_columns=pq.SortingColumn.from_ordering(
+                table.schema, [(column, "ascending") for column in SORT_COLUMNS]
+            ),
+            bloom_filter_options={column: {"ndv": ndv, "fpp": 0.01} for column, ndv in BLOOM_FILTER_COLUMNS.items()},
+        )
 
 
-def main() -> None:
-    for indicador in INDICADORES:
-        folder = f"./data/transformed/indicadores/{indicador}.parquet"
-        if os.path.exists(folder):
-            logger.debug(f"Overwriting {folder}")
-            rmtree(folder)
-        for year in range(2016, 2023):
-            logger.info(f"{indicador} - {year}")
-            try:
-                df_municipios = load_dataframe(indicador, year, "MUNICIPIOS")
-                df_brasil = load_dataframe(indicador, year, "BRASIL_REGIOES_UFS")
-            except FileNotFoundError:  # TRE 2022
-                logger.error(f"{indicador} - {year} failed")
+def get_entry(files: list[str], code_version: str, excel_engine: str, partition: str) -> dict:
+    return {
+        "inputs": [get_file_info(file) for file in files],
+        "code_version": code_version,
+        "excel_engine": excel_engine,
+        "partition": partition
+    }
+
+
+def replace_partition(staging: str, partition: str) -> None:
+    # a partição antiga só sai do dataset depois que a nova está completa; diretórios iniciados por "."
+    # são ignorados na leitura do dataset
+    destination = f"{DATASET}/{partition}"
+    old = f"{DATASET}/.{partition.replace('/', '-')}.old"
+    os.makedirs(os.path.dirname(destination), exist_ok=True)
+    rmtree(old, ignore_errors=True)
+    if os.path.exists(destination):
+        os.rename(destination, old)
+    os.rename(f"{staging}/{partition}", destination)
+    rmtree(old, ignore_errors=True)
+    rmtree(staging)
+
+
+def transform_planilha(planilha: str, year: int, indicadores: list[str], incremental: bool, excel_engine: str) -> float:
+    # cada tarefa grava apenas as partições NU_ANO_CENSO={year} dos seus indicadores, com nomes fixos, então
+    # tarefas simultâneas nunca escrevem no mesmo arquivo
+    logger.info(f"{planilha} - {year}")
+    start = perf_counter()
+    dfs_municipios = load_dataframes(planilha, year, "MUNICIPIOS", excel_engine)
+    dfs_brasil = load_dataframes(planilha, year, "BRASIL_REGIOES_UFS", excel_engine)
+    for indicador in indicadores:
+        df = transform_dataframe(dfs_municipios[indicador], dfs_brasil[indicador], indicador)
+        partition = f"SG_INDICADOR={indicador}/NU_ANO_CENSO={year}"
+        if incremental:
+            staging = f"./data/transformed/.indicadores-{indicador}-{year}.parquet"
+            rmtree(staging, ignore_errors=True)
+            save_dataframe(df, f"{staging}/{partition}")
+            replace_partition(staging, partition)
+        else:
+            save_dataframe(df, f"{DATASET}/{partition}")
+    return perf_counter() - start
+
+
+def main(incremental: bool = False, excel_engine: str = "openpyxl", workers: int = 1) -> None:
+    code_version = get_code_version(CODE_FILES)
+    manifest = load_manifest(MANIFEST) if incremental else {}
+    if not incremental and os.path.exists(DATASET):
+        logger.debug(f"Overwriting {DATASET}")
+        rmtree(DATASET)
+    if os.path.exists(LEGACY_FOLDER):
+        logger.info(f"Removing {LEGACY_FOLDER}, replaced by {DATASET}")
+        rmtree(LEGACY_FOLDER)
+
+    start = perf_counter()
+    durations, failures, tasks = {}, {}, {}
+    for planilha, indicadores in PLANILHAS.items():
+        for year in YEARS:
+            files = [get_file(planilha, year, base) for base in BASES]
+            if missing := [file for file in files if not os.path.isfile(file)]:  # TRE 2022
+                logger.error(f"{planilha} - {year} failed")
+                failures[f"{planilha}/{year}"] = FileNotFoundError(missing[0])
                 continue
-            df = transform_dataframe(df_municipios, df_brasil, indicador)
-            save_dataframe(df, indicador)
+            if not incremental:
+                tasks[(planilha, year)] = (files, indicadores)
+                continue
+            # o sha256 das planilhas só é calculado na execução incremental ou, após a transformação, para o manifesto
+            outdated = [
+                indicador for indicador in indicadores
+                if manifest.get(f"{indicador}/{year}") != get_entry(
+                    files, code_version, excel_engine, f"SG_INDICADOR={indicador}/NU_ANO_CENSO={year}"
+                )
+                or not os.path.isdir(f"{DATASET}/SG_INDICADOR={indicador}/NU_ANO_CENSO={year}")
+            ]
+            if outdated:
+                tasks[(planilha, year)] = (files, outdated)
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = {
+            executor.submit(transform_planilha, planilha, year, outdated, incremental, excel_engine):
+                (planilha, year)
+            for (planilha, year), (_, outdated) in tasks.items()
+        }
+        for future in as_completed(futures):
+            planilha, year = futures[future]
+            try:
+                durations[f"{planilha}/{year}"] = future.result()
+                files, outdated = tasks[(planilha, year)]
+                for indicador in outdated:
+                    manifest[f"{indicador}/{year}"] = get_entry(
+                        files, code_version, excel_engine, f"SG_INDICADOR={indicador}/NU_ANO_CENSO={year}"
+                    )
+            except Exception as e:
+                logger.error(f"{planilha} - {year} failed: {e!r}")
+                failures[f"{planilha}/{year}"] = e
+    save_manifest(MANIFEST, manifest)
+
+    for task, duration in sorted(durations.items()):
+        logger.info(f"{task}: {duration:.1f}s")
+    logger.info(f"Total: {perf_counter() - start:.1f}s with {workers} workers")
+    if failures:
+        logger.error(f"Failed tasks: {sorted(failures)}")
 
 
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--incremental", action="store_true",
+                        help="reprocessa apenas os pares indicador/ano cujas planilhas ou código de transformação "
+                             "mudaram desde a última execução")
+    parser.add_argument("--excel-engine", choices=["openpyxl", "calamine"], default="openpyxl",
+                        help="leitor das planilhas; o calamine (pip install python-calamine) é bem mais rápido")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="quantidade de processos; cada um transforma uma planilha de um ano por vez")
+    args = parser.parse_args()
+    main(incremental=args.incremental, excel_engine=args.excel_engine, workers=args.workers)
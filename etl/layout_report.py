@@ -0,0 +1,166 @@
+import argparse
+import logging
+import os
+import statistics
+from time import perf_counter
+
+import duckdb
+import pandas as pd
+import pyarrow.dataset as ds
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(name="layout - report")
+
+# consultas equivalentes às das páginas do app, com um filtro geográfico por consulta; o app troca o nome escolhido
+# pelo código do IBGE (utils.get_filtros_codigo), e a consulta pelo nome fica para comparação
+QUERIES = {
+    "Quantidade de escolas | Município": """
+        select NU_ANO_CENSO, TP_DEPENDENCIA, count(distinct CO_ENTIDADE)
+        from microdados
+        where CO_MUNICIPIO = $co_municipio and TP_SITUACAO_FUNCIONAMENTO = 'Em Atividade'
+        group by all
+    """,
+    "Quantidade de escolas | Município (nome)": """
+        select NU_ANO_CENSO, TP_DEPENDENCIA, count(distinct CO_ENTIDADE)
+        from microdados
+        where NO_MUNICIPIO = $municipio and TP_SITUACAO_FUNCIONAMENTO = 'Em Atividade'
+        group by all
+    """,
+    "Quantidade de matrículas | Unidade da Federação": """
+        select NU_ANO_CENSO, sum(QT_MAT_BAS), sum(QT_MAT_INF), sum(QT_MAT_FUND), sum(QT_MAT_MED)
+        from microdados
+        where CO_UF = $co_uf and TP_DEPENDENCIA = 'Municipal'
+        group by all
+    """,
+    "Acesso a serviços básicos | Mesorregião": """
+        select NU_ANO_CENSO, NO_MESORREGIAO, count(*) filter (where IN_AGUA_REDE_PUBLICA) / count(*)
+        from microdados
+        where CO_MESORREGIAO = $co_mesorregiao
+        group by all
+    """,
+    "Índices Educacionais | Linha": """
+        select NU_ANO_CENSO, TP_GRUPO, METRICA
+        from TAP
+        where NO_LOCALIDADE_GEOGRAFICA = $municipio and NO_CATEGORIA = 'Total' and NO_DEPENDENCIA = 'Total'
+    """,
+    "Índices Educacionais | Mapa": """
+        select NU_ANO_CENSO, NO_LOCALIDADE_GEOGRAFICA, METRICA
+        from AFD
+        where TP_LOCALIDADE_GEOGRAFICA = 'Unidade Federativa' and NO_CATEGORIA = 'Total'
+            and NO_DEPENDENCIA = 'Total'
+    """,
+}
+
+
+# filtros de cada consulta usados para medir o descarte de row groups pelas estatísticas no scanner do pyarrow,
+# o mesmo usado pelo app; colunas dictionary (NO_*) não têm estatísticas aproveitadas por ele, apenas as de código
+FILTERS = {
+    "Quantidade de escolas | Município": ("microdados.parquet", {"CO_MUNICIPIO": "co_municipio"}),
+    "Quantidade de escolas | Município (nome)": ("microdados.parquet", {"NO_MUNICIPIO": "municipio"}),
+    "Quantidade de matrículas | Unidade da Federação": ("microdados.parquet", {"CO_UF": "co_uf"}),
+    "Acesso a serviços básicos | Mesorregião": ("microdados.parquet", {"CO_MESORREGIAO": "co_mesorregiao"}),
+    "Índices Educacionais | Linha": ("TAP", {"NO_LOCALIDADE_GEOGRAFICA": "municipio"}),
+    "Índices Educacionais | Mapa": ("AFD", {}),
+}
+
+
+def get_indicadores_path(folder: str, indicador: str) -> tuple[str, dict[str, str]]:
+    # dataset único particionado por indicador ou, no layout anterior, um dataset por indicador
+    if os.path.isdir(f"{folder}/indicadores.parquet"):
+        return f"{folder}/indicadores.parquet", {"SG_INDICADOR": indicador}
+    return f"{folder}/indicadores/{indicador}.parquet", {}
+
+
+def get_connection(folder: str) -> duckdb.DuckDBPyConnection:
+    con = duckdb.connect()
+    con.execute(f"""
+        create view microdados as
+        select * from read_parquet('{folder}/microdados.parquet/*/*.parquet', hive_partitioning = true)
+    """)
+    for indicador in ("TAP", "AFD"):
+        path, partitions = get_indicadores_path(folder, indicador)
+        where = " and ".join(f"{column} = '{value}'" for column, value in partitions.items()) or "true"
+        con.execute(f"""
+            create view {indicador} as
+            select * from read_parquet('{path}/**/*.parquet', hive_partitioning = true)
+            where {where}
+        """)
+    return con
+
+
+def get_parameters(con: duckdb.DuckDBPyConnection) -> dict[str, str | int]:
+    municipio, co_municipio, co_uf, co_mesorregiao = con.execute(
+        "select NO_MUNICIPIO, CO_MUNICIPIO, CO_UF, CO_MESORREGIAO from microdados limit 1"
+    ).fetchone()
+    return {"municipio": municipio, "co_municipio": co_municipio, "co_uf": co_uf, "co_mesorregiao": co_mesorregiao}
+
+
+def get_rows_scanned(path: str, filters: dict[str, str], parameters: dict[str, str | int]) -> tuple[int, int]:
+    dataset = ds.dataset(path, format="parquet", partitioning="hive")
+    # partições são descartadas pelo caminho e os demais filtros pelas estatísticas de cada row group
+    partitions = set(dataset.partitioning.schema.names)
+    expression, statistics_expression = ds.scalar(True), ds.scalar(True)
+    for column, value in filters.items():
+        expression &= ds.field(column) == parameters.get(value, value)
+        if column not in partitions:
+            statistics_expression &= ds.field(column) == parameters.get(value, value)
+    # linhas das partições selecionadas e, delas, as dos row groups que restam após as estatísticas
+    fragments = list(dataset.get_fragments(filter=expression))
+    rows = sum(row_group.num_rows for fragment in fragments for row_group in fragment.row_groups)
+    scanned = sum(
+        row_group.num_rows
+        for fragment in fragments
+        for row_group_fragment in fragment.split_by_row_group(filter=statistics_expression)
+        for row_group in row_group_fragment.row_groups
+    )
+    return rows, scanned
+
+
+def run_queries(folder: str, parameters: dict[str, str | int], repetitions: int) -> pd.DataFrame:
+    con = get_connection(folder)
+    rows = []
+    for name, query in QUERIES.items():
+        parameters_query = {key: value for key, value in parameters.items() if f"${key}" in query}
+        latencies = []
+        for _ in range(repetitions):
+            start = perf_counter()
+            con.execute(query, parameters_query).fetchall()
+            latencies.append(perf_counter() - start)
+        path, filters = FILTERS[name]
+        if path == "microdados.parquet":
+            path = f"{folder}/{path}"
+        else:
+            path, partitions = get_indicadores_path(folder, path)
+            filters = filters | partitions
+        partition_rows, scanned = get_rows_scanned(path, filters, parameters)
+        rows.append(
+            {
+                "query": name,
+                "rows": partition_rows,
+                "rows scanned": scanned,
+                "latency (ms)": statistics.median(latencies) * 1000,
+            }
+        )
+    return pd.DataFrame(rows).set_index("query")
+
+
+def main(before: str, after: str, repetitions: int) -> None:
+    parameters = get_parameters(get_connection(after))
+    logger.info(f"Parameters: {parameters}")
+    df = run_queries(before, parameters, repetitions).join(
+        run_queries(after, parameters, repetitions), lsuffix=" before", rsuffix=" after"
+    )
+    df["rows scanned ratio"] = df["rows scanned after"] / df["rows scanned before"]
+    df["speedup"] = df["latency (ms) before"] / df["latency (ms) after"]
+    logger.info(f"\n{df.round(3).to_string()}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Compara linhas lidas e latência das consultas das páginas entre dois layouts de data/transformed"
+    )
+    parser.add_argument("--before", required=True, help="cópia de data/transformed com o layout anterior")
+    parser.add_argument("--after", default="./data/transformed")
+    parser.add_argument("--repetitions", type=int, default=5)
+    args = parser.parse_args()
+    main(args.before, args.after, args.repetitions)
@@ -0,0 +1,121 @@
+import argparse
+import logging
+import os
+from time import perf_counter
+
+import duckdb
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(name="etl - load")
+
+FOLDER = "./data/transformed"
+DATABASE = "./data/educenso.duckdb"
+
+INDICADORES = ["AFD", "DSU", "IED", "ATU", "HAD", "TDI", "TAP", "TRP", "TAB"]
+
+# tabelas nativas carregadas do parquet; a ordem de inserção define as zone maps (min/max por row group) que o
+# duckdb usa para pular dados nos filtros geográficos e por indicador
+TABELAS = {
+    "microdados": {
+        "path": f"{FOLDER}/microdados.parquet/*/*.parquet",
+        "hive_types": {"NU_ANO_CENSO": "INTEGER"},
+        "order": ["NU_ANO_CENSO", "CO_REGIAO", "CO_UF", "CO_MESORREGIAO", "CO_MICRORREGIAO", "CO_MUNICIPIO"],
+    },
+    "microdados_cubo": {
+        "path": f"{FOLDER}/microdados_cubo.parquet/*/*.parquet",
+        "hive_types": {"NU_ANO_CENSO": "INTEGER"},
+        "order": ["NU_ANO_CENSO", "CO_REGIAO", "CO_UF", "CO_MESORREGIAO", "CO_MICRORREGIAO", "CO_MUNICIPIO"],
+    },
+    "geografia": {
+        "path": f"{FOLDER}/geografia.parquet",
+        "hive_types": None,
+        "order": ["CO_MUNICIPIO"],
+    },
+    "indicadores": {
+        "path": f"{FOLDER}/indicadores.parquet/*/*/*/*.parquet",
+        "hive_types": {"SG_INDICADOR": "VARCHAR", "NU_ANO_CENSO": "INTEGER", "TP_LOCALIDADE_GEOGRAFICA": "VARCHAR"},
+        "order": ["SG_INDICADOR", "TP_LOCALIDADE_GEOGRAFICA", "NO_LOCALIDADE_GEOGRAFICA", "NO_CATEGORIA",
+                  "NO_DEPENDENCIA", "TP_GRUPO", "NU_ANO_CENSO"],
+    },
+    "catalogo": {
+        "path": f"{FOLDER}/catalogo.parquet",
+        "hive_types": None,
+        "order": ["FONTE", "DIMENSAO", "NIVEL", "ROTULO", "PAI_VALOR"],
+    },
+}
+
+# agregados menores que o cubo, calculados a partir dele, para as consultas sem o detalhe de município
+RESUMOS = {
+    "microdados_uf": ["NU_ANO_CENSO", "NO_PAIS", "CO_REGIAO", "NO_REGIAO", "CO_UF", "NO_UF", "SG_UF",
+                      "TP_DEPENDENCIA", "TP_LOCALIZACAO"],
+}
+
+
+def get_read_parquet(path: str, hive_types: dict[str, str] | None) -> str:
+    if hive_types is None:
+        return f"read_parquet('{path}')"
+    types = ", ".join(f"'{column}': {column_type}" for column, column_type in hive_types.items())
+    return f"read_parquet('{path}', hive_partitioning = true, hive_types = {{{types}}}, union_by_name = true)"
+
+
+def load_tabela(con: duckdb.DuckDBPyConnection, tabela: str, path: str, hive_types: dict | None,
+                order: list[str]) -> None:
+    start = perf_counter()
+    con.execute(f"""
+        create table {tabela} as
+        select * from {get_read_parquet(path, hive_types)}
+        order by {", ".join(order)}
+    """)
+    rows = con.execute(f"select count(*) from {tabela}").fetchone()[0]
+    logger.info(f"{tabela}: {rows} rows in {perf_counter() - start:.1f}s")
+
+
+def load_resumo(con: duckdb.DuckDBPyConnection, resumo: str, dimensoes: list[str]) -> None:
+    # todas as medidas do cubo são aditivas, então o resumo é a soma das suas linhas
+    colunas = [
+        column for column, in con.execute(
+            "select column_name from duckdb_columns() where table_name = 'microdados_cubo' order by column_index"
+        ).fetchall()
+    ]
+    medidas = [column for column in colunas if column.startswith("QT_")]
+    con.execute(f"""
+        create table {resumo} as
+        select {", ".join(dimensoes)}, {", ".join(f"sum({medida})::bigint as {medida}" for medida in medidas)}
+        from microdados_cubo
+        group by all
+        order by {", ".join(dimensoes)}
+    """)
+    rows = con.execute(f"select count(*) from {resumo}").fetchone()[0]
+    logger.info(f"{resumo}: {rows} rows")
+
+
+def main(database: str = DATABASE) -> None:
+    start = perf_counter()
+    # o banco é montado ao lado e só substitui o anterior quando completo, sem interromper quem está lendo
+    tmp = f"{database}.tmp"
+    if os.path.exists(tmp):
+        os.remove(tmp)
+    con = duckdb.connect(tmp)
+    for tabela, options in TABELAS.items():
+        load_tabela(con, tabela, options["path"], options["hive_types"], options["order"])
+    for resumo, dimensoes in RESUMOS.items():
+        load_resumo(con, resumo, dimensoes)
+    # os nomes usados pelo app para cada indicador
+    for indicador in INDICADORES:
+        con.execute(f"""
+            create view {indicador} as
+            select * exclude (SG_INDICADOR) from indicadores where SG_INDICADOR = '{indicador}'
+        """)
+    con.execute("checkpoint")
+    con.close()
+    os.replace(tmp, database)
+    logger.info(f"{database}: {os.path.getsize(database) / 2**20:.1f} MB in {perf_counter() - start:.1f}s")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Carrega os parquets de data/transformed em um banco DuckDB aberto pelo app em modo leitura"
+    )
+    parser.add_argument("--database", default=DATABASE, help="arquivo do banco gerado")
+    args = parser.parse_args()
+    main(args.database)
@@ -0,0 +1,38 @@
+import hashlib
+import json
+import os
+from functools import cache
+
+# manifestos das transformações: para cada partição, os arquivos de entrada (caminho, tamanho e sha256) e a versão
+# do código que a gerou; uma execução incremental refaz apenas as partições cuja entrada mudou
+
+
+@cache
+def get_file_info(path: str) -> dict[str, str | int]:
+    sha256 = hashlib.sha256()
+    with open(path, "rb") as file:
+        while chunk := file.read(1 << 20):
+            sha256.update(chunk)
+    return {"path": path, "size": os.path.getsize(path), "sha256": sha256.hexdigest()}
+
+
+def get_code_version(paths: list[str]) -> str:
+    sha256 = hashlib.sha256()
+    for path in paths:
+        with open(path, "rb") as file:
+            sha256.update(file.read())
+    return sha256.hexdigest()
+
+
+def load_manifest(path: str) -> dict[str, dict]:
+    if not os.path.isfile(path):
+        return {}
+    with open(path) as file:
+        return json.load(file)
+
+
+def save_manifest(path: str, manifest: dict[str, dict]) -> None:
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(f"{path}.tmp", "w") as file:
+        json.dump(manifest, file, indent=2)
+    os.replace(f"{path}.tmp", path)
@@ -0,0 +1,129 @@
+import logging
+import os
+from shutil import rmtree
+
+import duckdb
+import pyarrow.parquet as pq
+from pyarrow import dataset as ds
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(name="microdados - aggregate")
+
+SOURCE = "./data/transformed/microdados.parquet"
+DATASET = "./data/transformed/microdados_cubo.parquet"
+
+# grão do cubo: ano x município x dependência x localização; os demais níveis geográficos são atributos do
+# município, então qualquer nível acima é obtido somando as linhas do cubo
+GEOGRAFIA = [
+    "NO_PAIS",
+    "CO_REGIAO", "NO_REGIAO",
+    "CO_UF", "NO_UF", "SG_UF",
+    "CO_MESORREGIAO", "NO_MESORREGIAO",
+    "CO_MICRORREGIAO", "NO_MICRORREGIAO",
+    "CO_MUNICIPIO", "NO_MUNICIPIO",
+]
+DIMENSOES = ["TP_DEPENDENCIA", "TP_LOCALIZACAO"]
+
+SERVICOS = {
+    "AGUA": [
+        "IN_AGUA_REDE_PUBLICA", "IN_AGUA_POCO_ARTESIANO", "IN_AGUA_CACIMBA", "IN_AGUA_FONTE_RIO", "IN_AGUA_INEXISTENTE"
+    ],
+    "ENERGIA": [
+        "IN_ENERGIA_REDE_PUBLICA", "IN_ENERGIA_GERADOR_FOSSIL", "IN_ENERGIA_RENOVAVEL", "IN_ENERGIA_INEXISTENTE"
+    ],
+    "ESGOTO": [
+        "IN_ESGOTO_REDE_PUBLICA", "IN_ESGOTO_FOSSA_SEPTICA", "IN_ESGOTO_FOSSA_COMUM", "IN_ESGOTO_FOSSA",
+        "IN_ESGOTO_INEXISTENTE"
+    ],
+    "LIXO": [
+        "IN_LIXO_SERVICO_COLETA", "IN_LIXO_QUEIMA", "IN_LIXO_ENTERRA", "IN_LIXO_DESTINO_FINAL_PUBLICO",
+        "IN_LIXO_DESCARTA_OUTRA_AREA"
+    ],
+    "INTERNET": ["IN_INTERNET"],
+}
+
+# escolas sem nenhuma opção marcada no serviço; para a internet, apenas as sem resposta
+SEM_INFORMACOES = {
+    servico: f"not coalesce({' or '.join(flags)}, false)" for servico, flags in SERVICOS.items()
+} | {"INTERNET": "IN_INTERNET is null"}
+
+MATRICULAS = [
+    "QT_MAT_BAS", "QT_MAT_INF_CRE", "QT_MAT_INF_PRE", "QT_MAT_INF", "QT_MAT_FUND_AI", "QT_MAT_FUND_AF",
+    "QT_MAT_FUND", "QT_MAT_MED", "QT_MAT_PROF", "QT_MAT_PROF_TEC", "QT_MAT_EJA_FUND", "QT_MAT_EJA_MED",
+    "QT_MAT_EJA", "QT_MAT_ESP_CC", "QT_MAT_ESP_CE", "QT_MAT_ESP"
+]
+
+SORT_COLUMNS = ["CO_REGIAO", "CO_UF", "CO_MESORREGIAO", "CO_MICRORREGIAO", "CO_MUNICIPIO"] + DIMENSOES
+ROW_GROUP_SIZE = 16_384
+
+
+def get_query() -> str:
+    # cada escola aparece uma única vez por ano, então as contagens distintas por célula podem ser somadas
+    measures = [
+        "count(*) as QT_REGISTROS",
+        """count(distinct CO_ENTIDADE) filter (
+            where TP_SITUACAO_FUNCIONAMENTO = 'Em Atividade'
+            and (QT_MAT_INF > 0 or QT_MAT_FUND > 0 or QT_MAT_MED > 0 or QT_MAT_EJA > 0)
+        ) as QT_ESCOLAS_ATIVAS""",
+    ]
+    measures += [f"count(*) filter (where {flag}) as QT_{flag}" for flags in SERVICOS.values() for flag in flags]
+    measures += [f"count(*) filter (where {condition}) as QT_SEM_INFO_{servico}"
+                 for servico, condition in SEM_INFORMACOES.items()]
+    measures += [f"sum({column})::bigint as {column}" for column in MATRICULAS]
+    return f"""
+        select
+            {", ".join(GEOGRAFIA + DIMENSOES)},
+            {", ".join(measures)}
+        from microdados
+        where NU_ANO_CENSO = $year
+        group by all
+        order by {", ".join(SORT_COLUMNS)}
+    """
+
+
+def replace_dataset(staging: str) -> None:
+    # o cubo anterior só sai depois que o novo está completo: um app em execução encontra um ou outro, nunca um cubo
+    # parcial (entre as duas renomeações, o diretório fica ausente apenas por um instante)
+    old = f"{DATASET}.old"
+    rmtree(old, ignore_errors=True)
+    if os.path.exists(DATASET):
+        os.rename(DATASET, old)
+    os.rename(staging, DATASET)
+    rmtree(old, ignore_errors=True)
+
+
+def main() -> None:
+    microdados = ds.dataset(SOURCE, format="parquet", partitioning="hive")
+    con = duckdb.connect()
+    con.register("microdados", microdados)
+    years = sorted(int(fragment.path.split("NU_ANO_CENSO=")[1].split("/")[0])
+                   for fragment in microdados.get_fragments())
+
+    # o cubo novo é montado ano a ano fora do dataset e trocado de uma vez no fim
+    staging = f"{DATASET}.tmp"
+    rmtree(staging, ignore_errors=True)
+    try:
+        query = get_query()
+        for year in years:
+            logger.info(f"Aggregating {year}")
+            table = con.execute(query, {"year": year}).to_arrow_table()
+            # nomes geográficos como texto simples, para que o scanner do pyarrow use as estatísticas min/max
+            folder = f"{staging}/NU_ANO_CENSO={year}"
+            os.makedirs(folder, exist_ok=True)
+            pq.write_table(
+                table,
+                f"{folder}/part-0.parquet",
+                row_group_size=ROW_GROUP_SIZE,
+                compression="zstd",
+                write_statistics=True,
+                write_page_index=True,
+            )
+            rows = microdados.count_rows(filter=ds.field("NU_ANO_CENSO") == year)
+            logger.info(f"{year}: {rows} -> {table.num_rows} rows")
+        replace_dataset(staging)
+    finally:
+        rmtree(staging, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+import argparse
+import logging
+import os
+from tempfile import TemporaryDirectory
+from time import perf_counter
+from timeit import repeat
+
+import numpy as np
+import pandas as pd
+
+from extract import unzip_file
+from transform import load_dataframe, parse_date, save_dataframe, transform_dataframe, transform_date_columns
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(name="microdados - benchmark")
+
+
+def get_date_column(rows: int) -> pd.Series:
+    # distribuição próxima de DT_ANO_LETIVO_INICIO: poucas datas distintas, sentinelas "0" e nulos
+    rng = np.random.default_rng(0)
+    dates = pd.date_range("2021-01-01", "2021-12-31").strftime("%d%b%Y:00:00:00").str.upper()
+    values = rng.choice(np.array([*dates, "0", None], dtype=object), size=rows)
+    return pd.Series(values, name="DT_ANO_LETIVO_INICIO")
+
+
+def benchmark_date_columns(rows: int, repetitions: int) -> None:
+    column = get_date_column(rows)
+    apply = min(repeat(lambda: column.apply(parse_date), number=1, repeat=repetitions))
+    vectorized = min(repeat(lambda: transform_date_columns(column.to_frame()), number=1, repeat=repetitions))
+    logger.info(f"Dates ({rows} rows) - apply: {apply:.3f}s | vectorized: {vectorized:.3f}s "
+                f"| speedup: {apply / vectorized:.1f}x")
+
+
+def get_bytes_written() -> int:
+    # bytes gravados pelo processo até agora (linux)
+    with open("/proc/self/io") as file:
+        return int(next(line for line in file if line.startswith("wchar")).split()[1])
+
+
+def run_year(year: int, unzip: bool, folder: str) -> tuple[float, int]:
+    bytes_written = get_bytes_written()
+    start = perf_counter()
+    if unzip:
+        unzip_file(year)
+    save_dataframe(transform_dataframe(load_dataframe(year)), folder)
+    return perf_counter() - start, get_bytes_written() - bytes_written
+
+
+def benchmark_zip_streaming(year: int) -> None:
+    # extração do csv + transform contra o transform lendo o csv direto do zip; um csv já extraído é preservado
+    csv_file = f"./data/raw/microdados/{year}.csv"
+    backup = f"{csv_file}.benchmark"
+    if os.path.isfile(csv_file):
+        os.rename(csv_file, backup)
+    try:
+        with TemporaryDirectory() as folder:
+            zip_time, zip_bytes = run_year(year, False, folder)
+            unzip_time, unzip_bytes = run_year(year, True, folder)
+    finally:
+        if os.path.isfile(csv_file):
+            os.remove(csv_file)
+        if os.path.isfile(backup):
+            os.rename(backup, csv_file)
+    logger.info(f"{year} unzip + transform: {unzip_time:.1f}s, {unzip_bytes / 2 ** 20:.1f} MB written")
+    logger.info(f"{year} transform from zip: {zip_time:.1f}s, {zip_bytes / 2 ** 20:.1f} MB written")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("benchmark", nargs="?", choices=["dates", "zip"], default="dates")
+    parser.add_argument("--rows", type=int, default=240_000, help="quantidade de linhas, próxima de um ano do censo")
+    parser.add_argument("--repetitions", type=int, default=3)
+    parser.add_argument("--year", type=int, default=2022, help="ano do censo usado no benchmark zip")
+    args = parser.parse_args()
+    match args.benchmark:
+        case "dates":
+            benchmark_date_columns(args.rows, args.repetitions)
+        case "zip":
+            benchmark_zip_streaming(args.year)
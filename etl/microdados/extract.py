@@ -1,66 +1,76 @@
+import argparse
 import logging
 import os
+import shutil
+import sys
 import warnings
-from time import sleep
 from zipfile import ZipFile, BadZipfile
 
 import backoff
 import requests
 
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from download import CHUNK_SIZE, is_permanent_error, make_request, save_manifest_entry  # noqa: E402
+from manifest import load_manifest  # noqa: E402
+
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger("microdados - extract")
 
 warnings.filterwarnings("ignore")
 
+BASE_URL = "https://download.inep.gov.br"
+MANIFEST = "./data/raw/microdados.manifest.json"
+
+session = requests.Session()
 
+
+#  pode acontecer do zip não ser baixado corretamente; a nova tentativa retoma o .part quando o servidor aceita Range
 @backoff.on_exception(
     backoff.expo,
-    requests.exceptions.RequestException,
-    max_tries=2
+    (requests.exceptions.RequestException, BadZipfile),
+    max_tries=8,
+    giveup=is_permanent_error
 )
-def make_request(url: str) -> None:
-    os.makedirs("./data/raw/microdados/zips", exist_ok=True)
-    with requests.get(url, stream=True, verify=False, timeout=600) as r:
-        r.raise_for_status()
-        with open(f"./data/raw/microdados/zips/{year}.zip", 'wb') as f:
-            for chunk in r.iter_content(chunk_size=8192):
-                f.write(chunk)
-
-
-def test_zip(year: int) -> None:
-    ZipFile(f"./data/raw/microdados/zips/{year}.zip", 'r')
-
-
-def download_file(year: int) -> None:
-    url = f"https://download.inep.gov.br/dados_abertos/microdados_censo_escolar_{year}.zip"
+def download_file(year: int, base_url: str = BASE_URL) -> bool:
+    url = f"{base_url}/dados_abertos/microdados_censo_escolar_{year}.zip"
     logger.info(f"Downloading {url}")
-    try:
-        make_request(url)
-        test_zip(year)
-    except (requests.exceptions.ChunkedEncodingError, BadZipfile):
-        sleep(100)
-        if f"./data/raw/microdados/zips/{year}.zip" in os.listdir():
-            os.remove(f"{year}.zip")
-        make_request(url)
-        test_zip(year)
-
+    os.makedirs("./data/raw/microdados/zips", exist_ok=True)
+    file = f"./data/raw/microdados/zips/{year}.zip"
+    entry = make_request(session, url, file, load_manifest(MANIFEST).get(str(year)))
+    if entry is None:
+        logger.info(f"{year} not modified")
+        return False
+    save_manifest_entry(MANIFEST, str(year), entry)
     logger.debug("Download complete")
+    return True
 
 
 def unzip_file(year: int) -> None:
+    # apenas o csv é extraído, gravado uma única vez já com o nome final
     logger.debug("Unzipping")
     with ZipFile(f"./data/raw/microdados/zips/{year}.zip", 'r') as zip:
-        zip.extractall("data/raw/microdados")
         csv_file = [file for file in zip.namelist() if ".csv" in file.lower()]
-        zip.extractall("data/raw/microdados", members=csv_file)
-        os.rename(
-            f"./data/raw/microdados/{csv_file[0]}",
-            f"./data/raw/microdados/{year}.csv"
-        )
+        with zip.open(csv_file[0]) as source, open(f"./data/raw/microdados/{year}.csv.tmp", "wb") as destination:
+            shutil.copyfileobj(source, destination, CHUNK_SIZE)
+    os.replace(f"./data/raw/microdados/{year}.csv.tmp", f"./data/raw/microdados/{year}.csv")
     logger.debug("Unzip complete")
 
 
-if __name__ == "__main__":
+def main(base_url: str = BASE_URL, unzip: bool = True) -> None:
     for year in range(2016, 2023):
-        download_file(year)
-        unzip_file(year)
+        changed = download_file(year, base_url)
+        if not unzip:
+            # o transform lê o csv direto do zip; um csv extraído antes ficaria desatualizado e teria precedência
+            if os.path.isfile(f"./data/raw/microdados/{year}.csv"):
+                os.remove(f"./data/raw/microdados/{year}.csv")
+        elif changed or not os.path.isfile(f"./data/raw/microdados/{year}.csv"):
+            unzip_file(year)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--base-url", default=BASE_URL, help="servidor de origem dos zips")
+    parser.add_argument("--no-unzip", action="store_true",
+                        help="mantém apenas os zips; o transform lê o csv direto deles")
+    args = parser.parse_args()
+    main(args.base_url, unzip=not args.no_unzip)
@@ -0,0 +1,54 @@
+import logging
+import os
+
+import duckdb
+import pyarrow.parquet as pq
+from pyarrow import dataset as ds
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(name="microdados - geography")
+
+SOURCE = "./data/transformed/microdados.parquet"
+TABLE = "./data/transformed/geografia.parquet"
+
+# dimensão geográfica com um registro por município e a hierarquia completa, em códigos e nomes; microdados,
+# cubo e indicadores se ligam a ela por CO_MUNICIPIO ou CO_UF, junções por inteiro em vez de comparar nomes
+NIVEIS = [
+    ("CO_REGIAO", "NO_REGIAO"),
+    ("CO_UF", "NO_UF"),
+    ("CO_UF", "SG_UF"),
+    ("CO_MESORREGIAO", "NO_MESORREGIAO"),
+    ("CO_MICRORREGIAO", "NO_MICRORREGIAO"),
+]
+
+
+def get_query() -> str:
+    # nomes e divisões podem mudar entre os censos; vale o registro do ano mais recente
+    columns = [f"arg_max({codigo}, NU_ANO_CENSO) as {codigo}" for codigo in dict(NIVEIS)]
+    columns += [f"arg_max({nome}::varchar, NU_ANO_CENSO) as {nome}" for _, nome in NIVEIS]
+    return f"""
+        select
+            CO_MUNICIPIO,
+            arg_max(NO_MUNICIPIO::varchar, NU_ANO_CENSO) as NO_MUNICIPIO,
+            {", ".join(columns)},
+            'Brasil' as NO_PAIS
+        from microdados
+        group by CO_MUNICIPIO
+        order by CO_MUNICIPIO
+    """
+
+
+def main() -> None:
+    microdados = ds.dataset(SOURCE, format="parquet", partitioning="hive")
+    con = duckdb.connect()
+    con.register("microdados", microdados)
+
+    table = con.execute(get_query()).to_arrow_table()
+    os.makedirs(os.path.dirname(TABLE), exist_ok=True)
+    pq.write_table(table, f"{TABLE}.tmp", compression="zstd", write_statistics=True)
+    os.replace(f"{TABLE}.tmp", TABLE)
+    logger.info(f"{table.num_rows} municípios in {TABLE}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,46 +1,176 @@
+import argparse
 import json
 import logging
 import os
+import sys
 import warnings
+from bisect import bisect_right
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from datetime import datetime
+from functools import cache
 from shutil import rmtree
+from time import perf_counter
+from typing import BinaryIO, Iterator
+from zipfile import ZipFile
 
+import numpy as np
 import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+from pyarrow import csv
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from manifest import get_code_version, get_file_info, load_manifest, save_manifest  # noqa: E402
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(name="microdados - transform")
 
 warnings.filterwarnings("ignore")
 
+# estimativa do pico de memória por byte de csv lido no modo streaming (leitura + cópias das transformações)
+MEMORY_EXPANSION = 12
+MIN_BLOCK_SIZE = 1 << 20
+# ordenação externa do modo streaming: cada run ordenada ocupa até 1/SORT_RUN_FRACTION do teto de memória e é
+# lida de volta em blocos de MERGE_CHUNK linhas na intercalação
+SORT_RUN_FRACTION = 8
+MERGE_CHUNK = 4_096
+
+YEARS = range(2016, 2023)
+
+DATASET = "./data/transformed/microdados.parquet"
+MANIFEST = "./data/transformed/microdados.manifest.json"
+# arquivos cuja mudança invalida as partições já transformadas
+CODE_FILES = [
+    __file__,
+    "./etl/microdados/transform/schema.json",
+    "./etl/microdados/transform/map_categorical_columns.json",
+]
+
+DATE_FORMAT = "%d%b%Y:%H:%M:%S"
+
+# layout das partições: linhas agrupadas pela hierarquia geográfica para que as consultas filtradas por
+# localidade descartem quase todos os row groups pelas estatísticas min/max e pelos bloom filters
+SORT_COLUMNS = [
+    "CO_REGIAO", "CO_UF", "CO_MESORREGIAO", "CO_MICRORREGIAO", "CO_MUNICIPIO", "TP_DEPENDENCIA", "TP_LOCALIZACAO"
+]
+ROW_GROUP_SIZE = 16_384
+BLOOM_FILTER_COLUMNS = {
+    "NO_MESORREGIAO": 150,
+    "NO_MICRORREGIAO": 600,
+    "NO_MUNICIPIO": 6_000,
+    "CO_MUNICIPIO": 6_000,
+}
+
+
+def get_raw_file(year: int) -> str:
+    # o csv extraído tem precedência; sem ele, o csv é lido direto de dentro do zip baixado
+    if os.path.isfile(f"./data/raw/microdados/{year}.csv"):
+        return f"./data/raw/microdados/{year}.csv"
+    return f"./data/raw/microdados/zips/{year}.zip"
+
+
+def open_raw_file(year: int) -> BinaryIO:
+    file = get_raw_file(year)
+    if not file.endswith(".zip"):
+        return open(file, "rb")
+    # o membro é descomprimido à medida que o parser consome o stream, sem passar pelo disco
+    with ZipFile(file) as zip:
+        csv_file = [name for name in zip.namelist() if ".csv" in name.lower()]
+        return zip.open(csv_file[0])
+
+
+def read_header(year: int) -> list[str]:
+    with open_raw_file(year) as file:
+        return file.readline().decode("latin1").rstrip("\r\n").split(";")
+
+
+def get_dtypes(columns: list[str]) -> dict[str, str]:
+    with open("./etl/microdados/transform/schema.json") as file:
+        schema = json.load(file)
+
+    dtypes = {}
+    for column in columns:
+        if column in schema["columns"]:
+            dtypes[column] = schema["columns"][column]
+        elif prefix := next((prefix for prefix in schema["prefixes"] if column.startswith(prefix)), None):
+            dtypes[column] = schema["prefixes"][prefix]
+
+    if columns_not_mapped := set(columns).difference(dtypes):
+        raise Exception(f"Columns not mapped: {columns_not_mapped}")
+    return dtypes
+
 
 def load_dataframe(year: int) -> pd.DataFrame:
-    return pd.read_csv(
-        f"./data/raw/microdados/{year}.csv",
-        delimiter=";",
-        encoding="latin1",
-        low_memory=False,
+    with open_raw_file(year) as file:
+        return pd.read_csv(
+            file,
+            delimiter=";",
+            encoding="latin1",
+            dtype=get_dtypes(read_header(year)),
+        )
+
+
+def open_csv(file: BinaryIO, block_size: int, column_types: dict[str, pa.DataType]) -> csv.CSVStreamingReader:
+    return csv.open_csv(
+        file,
+        read_options=csv.ReadOptions(encoding="latin1", block_size=block_size),
+        parse_options=csv.ParseOptions(delimiter=";"),
+        convert_options=csv.ConvertOptions(column_types=column_types, strings_can_be_null=True),
     )
 
 
+def load_batches(year: int, block_size: int) -> Iterator[pd.DataFrame]:
+    # o leitor de csv do arrow só converte para dicionário com índices int32; a largura final é definida em
+    # get_partition_schema
+    arrow_types = {
+        "Int8": pa.int8(), "Int16": pa.int16(), "Int32": pa.int32(),
+        "int16": pa.int16(), "int32": pa.int32(), "int64": pa.int64(),
+        "str": pa.string(), "category": pa.dictionary(pa.int32(), pa.string()),
+    }
+    dtypes = get_dtypes(read_header(year))
+    column_types = {column: arrow_types[dtype] for column, dtype in dtypes.items()}
+    # o to_pandas converte inteiros com nulos para float, então os tipos do registro são reaplicados
+    dtypes = {column: dtype for column, dtype in dtypes.items() if dtype != "str"}
+    with open_raw_file(year) as file:
+        for batch in open_csv(file, block_size, column_types):
+            yield batch.to_pandas().astype(dtypes)
+
+
+def parse_date(date: object) -> datetime | None:
+    if isinstance(date, str) and date != "0":
+        return datetime.strptime(date.strip(), DATE_FORMAT)
+    return None
+
+
 def transform_date_columns(df: pd.DataFrame) -> pd.DataFrame:
     date_columns = [column for column in df.columns if column.startswith("DT")]
     for column in date_columns:
-        df[column] = df[column]. \
-            apply(
-            lambda date:
-            datetime.strptime(date, "%d%b%Y:%H:%M:%S")
-            if isinstance(date, str) and date != "0"
-            else None
-        )
+        values = df[column].where(df[column].ne("0"))
+        dates = pd.to_datetime(values, format=DATE_FORMAT, errors="coerce")
+
+        # apenas os valores que o parser vetorizado não reconheceu são convertidos linha a linha
+        not_parsed = dates.isna() & values.map(type).eq(str)
+        if not_parsed.any():
+            invalid = []
+            for index, value in values[not_parsed].items():
+                try:
+                    dates[index] = parse_date(value)
+                except ValueError:
+                    invalid.append(value)
+            if invalid:
+                logger.warning(f"{column}: {len(invalid)} invalid dates, e.g. {invalid[:5]}")
+        df[column] = dates
     return df
 
 
 def transform_boolean_columns(df: pd.DataFrame) -> pd.DataFrame:
     boolean_columns = [column for column in df.columns
                        if column.startswith("IN")]
+    # 9 (sem informação) vira nulo, distinto de False
     df[boolean_columns] = df[boolean_columns]. \
-        replace(to_replace=9.0, value=None). \
-        astype("bool")
+        replace(to_replace=9, value=pd.NA). \
+        astype("boolean")
     return df
 
 
@@ -50,79 +180,330 @@ def transform_integer_columns(df: pd.DataFrame) -> pd.DataFrame:
     df[integer_columns] = df[integer_columns]. \
         fillna(0). \
         astype("int32")
+    return df
 
-    df["NU_ANO_CENSO"] = df["NU_ANO_CENSO"]. \
-        astype("int16")
 
-    return df
+@cache
+def load_map_categorical_columns() -> dict[str, dict[str, str]]:
+    with open("./etl/microdados/transform/map_categorical_columns.json") as file:
+        return json.load(file)
+
+
+def get_categorical(codes: pd.Series, map_codes: dict[str, str]) -> pd.Categorical:
+    # tabela de consulta indexada pelo código: lookup[código] = posição do rótulo nas categorias
+    map_codes = {int(float(code)): label for code, label in map_codes.items()}
+    categories = list(dict.fromkeys(map_codes.values()))
+    values = codes.to_numpy(dtype="float64", na_value=np.nan)
+    values = np.where(np.isnan(values), -1, values).astype("int64")
+
+    lookup = np.full(max(*map_codes, values.max(initial=0)) + 1, -1, dtype="int32")
+    for code, label in map_codes.items():
+        lookup[code] = categories.index(label)
+
+    valid = values >= 0
+    category_codes = np.full(len(values), -1, dtype="int32")
+    category_codes[valid] = lookup[values[valid]]
+
+    # códigos fora do mapeamento são mantidos como texto, exceto o 9 (sem informação)
+    not_mapped = valid & (category_codes == -1) & (values != 9)
+    for code in np.unique(values[not_mapped]):
+        lookup[code] = len(categories)
+        categories.append(str(code))
+    category_codes[not_mapped] = lookup[values[not_mapped]]
+
+    return pd.Categorical.from_codes(category_codes, categories=categories).remove_unused_categories()
 
 
 def transform_categorical_columns(df: pd.DataFrame) -> pd.DataFrame:
     categorical_columns = [column for column in df.columns if column.startswith("TP")] + [
         "CO_LINGUA_INDIGENA_1", "CO_LINGUA_INDIGENA_2", "CO_LINGUA_INDIGENA_3"
     ]
-    with open("./etl/microdados/transform/map_categorical_columns.json") as file:
-        map_categorical_columns = json.load(file)
+    map_categorical_columns = load_map_categorical_columns()
 
     if columns_not_mapped := set(categorical_columns).difference(
             map_categorical_columns.keys()):
         raise Exception(f"Columns not mapped: {columns_not_mapped}")
-    df[categorical_columns] = df[categorical_columns]. \
-        astype("float"). \
-        fillna(-1). \
-        astype("int"). \
-        astype("str")
     for column in categorical_columns:
-        df[column] = df[column]. \
-            replace(to_replace=map_categorical_columns[column])
-    df[categorical_columns] = df[categorical_columns].replace(["-1", "9"], None)
+        df[column] = get_categorical(df[column], map_categorical_columns[column])
     return df
 
 
-def transform_identifier_columns(df: pd.DataFrame) -> pd.DataFrame:
-    identifier_columns = ["NU_DDD", "NU_TELEFONE", "NU_CNPJ_ESCOLA_PRIVADA",
-                          "NU_CNPJ_MANTENEDORA", "CO_ESCOLA_SEDE_VINCULADA", "CO_IES_OFERTANTE",
-                          "CO_DISTRITO", "CO_CEP"]
-    df[identifier_columns] = df[identifier_columns].astype("str")
+def create_new_columns(df: pd.DataFrame) -> pd.DataFrame:
+    df["NO_PAIS"] = "Brasil"
+    return df
 
-    identifier_columns_int = ["CO_REGIAO", "CO_UF", "CO_MESORREGIAO", "CO_MICRORREGIAO", "CO_MUNICIPIO"]
-    df[identifier_columns_int] = df[identifier_columns_int].astype("int32")
 
-    df["CO_ENTIDADE"] = df["CO_ENTIDADE"].astype("int64")
+def transform_dataframe(df: pd.DataFrame) -> pd.DataFrame:
+    df = transform_integer_columns(df)
+    df = transform_categorical_columns(df)
+    df = transform_date_columns(df)
+    df = transform_boolean_columns(df)
+    df = create_new_columns(df)
     return df
 
 
-def create_new_columns(df: pd.DataFrame) -> pd.DataFrame:
-    df["NO_PAIS"] = "Brasil"
-    return df
+def get_dictionary_index_type(column: str) -> pa.DataType:
+    # os mapas TP_* têm menos de 128 rótulos e cabem em int8; as línguas indígenas (~330) e os nomes geográficos
+    # (~5.570 municípios) precisam de int16. A largura depende só da coluna, nunca do lote, e um código que não
+    # caiba falha na conversão em vez de ser truncado
+    return pa.int8() if column.startswith("TP") else pa.int16()
 
 
-def save_dataframe(df: pd.DataFrame) -> None:
-    df.to_parquet(
-        "./data/transformed/microdados.parquet",
-        engine="pyarrow",
-        compression="snappy",
-        index=None,
-        partition_cols=["NU_ANO_CENSO"]
-    )
+def get_partition_schema(df: pd.DataFrame) -> pa.Schema:
+    # índices de dicionário com largura fixa e colunas sem valores como texto, para que todos os lotes
+    # e todos os anos tenham o mesmo schema
+    schema = pa.Schema.from_pandas(df, preserve_index=False)
+    for index, field in enumerate(schema):
+        if pa.types.is_dictionary(field.type):
+            index_type = get_dictionary_index_type(field.name)
+            value_type = pa.string() if pa.types.is_null(field.type.value_type) else field.type.value_type
+            schema = schema.set(index, field.with_type(pa.dictionary(index_type, value_type)))
+        elif pa.types.is_null(field.type):
+            schema = schema.set(index, field.with_type(pa.string()))
+    return schema
+
+
+def get_write_options(schema: pa.Schema) -> dict:
+    ordering = [(column, "ascending") for column in SORT_COLUMNS]
+    return {
+        "compression": "zstd",
+        "use_dictionary": True,
+        "write_statistics": True,
+        "write_page_index": True,
+        "sorting_columns": pq.SortingColumn.from_ordering(schema, ordering),
+        "bloom_filter_options": {column: {"ndv": ndv, "fpp": 0.01} for column, ndv in BLOOM_FILTER_COLUMNS.items()},
+    }
+
+
+def get_sort_indices(table: pa.Table) -> pa.Array:
+    # o arrow não ordena colunas de dicionário diretamente, então a ordem é calculada sobre os valores
+    keys = pa.table({
+        column: table[column].cast(table.schema.field(column).type.value_type)
+        if pa.types.is_dictionary(table.schema.field(column).type) else table[column]
+        for column in SORT_COLUMNS
+    })
+    return pc.sort_indices(keys, sort_keys=[(column, "ascending") for column in SORT_COLUMNS])
+
+
+def get_sort_key(table: pa.Table, row: int) -> tuple:
+    # mesma ordem de get_sort_indices, com os nulos no fim
+    return tuple((value is None, value) for value in (table[column][row].as_py() for column in SORT_COLUMNS))
+
+
+def write_partition(table: pa.Table, path: str) -> None:
+    table = table.take(get_sort_indices(table))
+    pq.write_table(table, path, row_group_size=ROW_GROUP_SIZE, **get_write_options(table.schema))
+
+
+def write_run(tables: list[pa.Table], path: str) -> None:
+    table = pa.concat_tables(tables)
+    pq.write_table(table.take(get_sort_indices(table)), path, row_group_size=MERGE_CHUNK, compression="snappy")
+
+
+def read_row_groups(path: str) -> Iterator[pa.Table]:
+    # um row group por vez: o iter_batches lê adiante e manteria vários blocos de cada run na memória
+    file = pq.ParquetFile(path)
+    for index in range(file.num_row_groups):
+        yield file.read_row_group(index)
+
+
+def merge_runs(runs: list[str], path: str, schema: pa.Schema) -> None:
+    # intercalação das runs em blocos: a cada rodada, o menor entre os últimos valores dos blocos em memória é um
+    # limite abaixo do qual todas as linhas já foram lidas; essas linhas são ordenadas e gravadas, e os blocos
+    # esgotados são lidos de novo
+    readers = [read_row_groups(run) for run in runs]
+    buffers = [next(reader) for reader in readers]
+    pending = schema.empty_table()
+    with pq.ParquetWriter(path, schema, **get_write_options(schema)) as writer:
+        while buffers:
+            bound = min(get_sort_key(buffer, buffer.num_rows - 1) for buffer in buffers)
+            parts = []
+            for index, buffer in enumerate(buffers):
+                count = bisect_right(range(buffer.num_rows), bound, key=lambda row: get_sort_key(buffer, row))
+                parts.append(buffer.slice(0, count))
+                buffers[index] = buffer.slice(count)
+            merged = pa.concat_tables(parts)
+            pending = pa.concat_tables([pending, merged.take(get_sort_indices(merged))])
+            while pending.num_rows >= ROW_GROUP_SIZE:
+                writer.write_table(pending.slice(0, ROW_GROUP_SIZE), row_group_size=ROW_GROUP_SIZE)
+                pending = pending.slice(ROW_GROUP_SIZE)
 
+            for index in reversed(range(len(buffers))):
+                if buffers[index].num_rows == 0:
+                    buffer = next(readers[index], None)
+                    if buffer is None:
+                        del buffers[index], readers[index]
+                    else:
+                        buffers[index] = buffer
+        if pending.num_rows:
+            writer.write_table(pending, row_group_size=ROW_GROUP_SIZE)
 
-def main() -> None:
-    folder = "./data/transformed/microdados.parquet"
-    if os.path.exists(folder):
-        logger.debug(f"Overwriting {folder}")
-        rmtree(folder)
-    for year in range(2016, 2023):
-        logger.info(year)
-        df = load_dataframe(year)
-        df = transform_integer_columns(df)
-        df = transform_identifier_columns(df)
-        df = transform_categorical_columns(df)
-        df = transform_date_columns(df)
-        df = transform_boolean_columns(df)
-        df = create_new_columns(df)
-        save_dataframe(df)
+
+def save_dataframe(df: pd.DataFrame, folder: str) -> None:
+    folder = f"{folder}/NU_ANO_CENSO={df['NU_ANO_CENSO'].iloc[0]}"
+    os.makedirs(folder, exist_ok=True)
+    df = df.drop(columns=["NU_ANO_CENSO"])
+    table = pa.Table.from_pandas(df, schema=get_partition_schema(df), preserve_index=False)
+    write_partition(table, f"{folder}/part-0.parquet")
+
+
+def save_batches(batches: Iterator[pd.DataFrame], year: int, folder: str, memory_limit: int) -> None:
+    # ordenação externa: os lotes são acumulados em runs ordenadas de tamanho limitado, gravadas em arquivos
+    # temporários e intercaladas no layout final, sem carregar o ano inteiro na memória
+    folder = f"{folder}/NU_ANO_CENSO={year}"
+    run_size = memory_limit // SORT_RUN_FRACTION
+    runs, tables, schema = [], [], None
+    try:
+        for df in batches:
+            df = df.drop(columns=["NU_ANO_CENSO"])
+            if schema is None:
+                os.makedirs(folder, exist_ok=True)
+                schema = get_partition_schema(df)
+            tables.append(pa.Table.from_pandas(df, schema=schema, preserve_index=False))
+            if sum(table.nbytes for table in tables) >= run_size:
+                runs.append(f"{folder}/.run-{len(runs)}.parquet")
+                write_run(tables, runs[-1])
+                tables = []
+        if tables:
+            runs.append(f"{folder}/.run-{len(runs)}.parquet")
+            write_run(tables, runs[-1])
+            tables = []
+        if not runs:
+            logger.warning(f"{year}: no rows in the csv, partition not written")
+            return
+        logger.debug(f"{year}: merging {len(runs)} sorted runs")
+        merge_runs(runs, f"{folder}/part-0.parquet", schema)
+    finally:
+        for run in runs:
+            if os.path.exists(run):
+                os.remove(run)
+
+
+def transform_year_streaming(year: int, memory_limit: int, folder: str) -> None:
+    block_size = max(memory_limit // MEMORY_EXPANSION, MIN_BLOCK_SIZE)
+    logger.debug(f"Streaming {year} in blocks of {block_size} bytes")
+    batches = (transform_dataframe(df) for df in load_batches(year, block_size))
+    save_batches(batches, year, folder, memory_limit)
+    logger.debug(f"Peak arrow memory: {pa.default_memory_pool().max_memory()} bytes")
+
+
+def get_entry(year: int, code_version: str) -> dict:
+    return {
+        "input": get_file_info(get_raw_file(year)),
+        "code_version": code_version,
+        "partition": f"NU_ANO_CENSO={year}"
+    }
+
+
+def replace_partition(staging: str, partition: str) -> None:
+    # a partição antiga só sai do dataset depois que a nova está completa; diretórios iniciados por "."
+    # são ignorados na leitura do dataset
+    destination = f"{DATASET}/{partition}"
+    old = f"{DATASET}/.{partition}.old"
+    os.makedirs(DATASET, exist_ok=True)
+    rmtree(old, ignore_errors=True)
+    if os.path.exists(destination):
+        os.rename(destination, old)
+    # um ano sem linhas não gera partição e fica fora do dataset
+    if os.path.exists(f"{staging}/{partition}"):
+        os.rename(f"{staging}/{partition}", destination)
+    rmtree(old, ignore_errors=True)
+
+
+def transform_year(year: int, streaming: bool, memory_limit: int, incremental: bool) -> float:
+    logger.info(year)
+    start = perf_counter()
+    folder = f"./data/transformed/.microdados-{year}.parquet" if incremental else DATASET
+    if incremental:
+        rmtree(folder, ignore_errors=True)
+    try:
+        if streaming:
+            transform_year_streaming(year, memory_limit, folder)
+        else:
+            df = load_dataframe(year)
+            df = transform_dataframe(df)
+            save_dataframe(df, folder)
+        if incremental:
+            replace_partition(folder, f"NU_ANO_CENSO={year}")
+    finally:
+        if incremental:
+            rmtree(folder, ignore_errors=True)
+    return perf_counter() - start
+
+
+def get_outdated_years(manifest: dict[str, dict], entries: dict[int, dict]) -> list[int]:
+    outdated = []
+    for year in YEARS:
+        if year not in entries:
+            logger.warning(f"{year}: raw file not found, keeping the current partition")
+        elif manifest.get(str(year)) != entries[year] or not os.path.isdir(f"{DATASET}/{entries[year]['partition']}"):
+            outdated.append(year)
+    return outdated
+
+
+def main(
+        streaming: bool = False,
+        memory_limit: int = 1 << 30,
+        workers: int = 1,
+        incremental: bool = False
+) -> None:
+    code_version = get_code_version(CODE_FILES)
+    # o sha256 dos csvs (alguns GB por ano) só é calculado para comparar com o manifesto, na execução incremental, ou
+    # para registrar no manifesto os anos transformados
+    entries = {}
+    if incremental:
+        entries = {year: get_entry(year, code_version) for year in YEARS if os.path.isfile(get_raw_file(year))}
+        manifest = load_manifest(MANIFEST)
+        years = get_outdated_years(manifest, entries)
+        logger.info(f"Outdated years: {years}")
+    else:
+        manifest = {}
+        years = list(YEARS)
+        if os.path.exists(DATASET):
+            logger.debug(f"Overwriting {DATASET}")
+            rmtree(DATASET)
+
+    # cada processo escreve apenas a partição NU_ANO_CENSO do seu ano
+    start = perf_counter()
+    durations, failures = {}, {}
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = {
+            executor.submit(transform_year, year, streaming, memory_limit // workers, incremental): year
+            for year in years
+        }
+        for future in as_completed(futures):
+            year = futures[future]
+            try:
+                durations[year] = future.result()
+                manifest[str(year)] = entries.get(year) or get_entry(year, code_version)
+            except Exception as e:
+                logger.error(f"{year} failed: {e!r}")
+                failures[year] = e
+    save_manifest(MANIFEST, manifest)
+
+    for year, duration in sorted(durations.items()):
+        logger.info(f"{year}: {duration:.1f}s")
+    logger.info(f"Total: {perf_counter() - start:.1f}s with {workers} workers")
+    if failures:
+        logger.error(f"Failed years: {sorted(failures)}")
 
 
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--streaming", action="store_true",
+                        help="lê o csv em lotes, com memória limitada, em vez de carregar o ano inteiro")
+    parser.add_argument("--memory-limit", type=int, default=1024,
+                        help="teto de memória (MB), dividido entre os processos, usado para dimensionar os lotes "
+                             "e as runs da ordenação externa do modo streaming")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="quantidade de anos transformados em paralelo, cada um em um processo")
+    parser.add_argument("--incremental", action="store_true",
+                        help="reprocessa apenas os anos cujo csv ou código de transformação mudou desde a última "
+                             "execução")
+    args = parser.parse_args()
+    main(
+        streaming=args.streaming,
+        memory_limit=args.memory_limit << 20,
+        workers=args.workers,
+        incremental=args.incremental
+    )